@@ -1 +1,12 @@
-# This file makes the 'core' directory a Python package.
\ No newline at end of file
+# This file makes the 'core' directory a Python package.
+import os
+
+from dotenv import load_dotenv
+
+# ローカル開発時は.envファイルから環境変数を読み込む（Azure上ではアプリ設定から供給される）
+# coreの各モジュールやfunction_appはインポート時に環境変数を参照するため、パッケージの読み込み時に1回だけ行う。
+# カレントディレクトリに依存しないよう、プロジェクトルート（このパッケージの親ディレクトリ）の.envを読む。
+# 既に設定されている環境変数（アプリ設定・local.settings.json）は上書きしない。
+_dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+if os.path.isfile(_dotenv_path):
+    load_dotenv(_dotenv_path)
@@ -1,36 +1,56 @@
 # モデル別の料金設定（USD per 1M tokens）
+# cache_write: プロンプトキャッシュ書き込み（入力単価の1.25倍）
+# cache_read: プロンプトキャッシュ読み込み（入力単価の0.1倍）
 PRICING = {
     "claude-haiku-4-5": {
         "input": 1.0,
-        "output": 5.0
+        "output": 5.0,
+        "cache_write": 1.25,
+        "cache_read": 0.1
     },
     "claude-sonnet-4-5": {
         "input": 3.0,
-        "output": 15.0
+        "output": 15.0,
+        "cache_write": 3.75,
+        "cache_read": 0.3
     }
 }
 
+# 1トークンあたりの単価（ナノUSD単位の整数、モジュール読み込み時に事前計算）
+# USD/1Mトークン × 1000 = ナノUSD/トークン。整数演算で集計し、最後に一度だけUSDへ変換することで丸め誤差の蓄積を防ぐ
+# 並び順: (input, output, cache_write, cache_read)
+_RATES_NANO_USD_PER_TOKEN = {
+    model: (
+        round(pricing["input"] * 1000),
+        round(pricing["output"] * 1000),
+        round(pricing["cache_write"] * 1000),
+        round(pricing["cache_read"] * 1000)
+    )
+    for model, pricing in PRICING.items()
+}
+
 def calculate_cost(usage_info: dict) -> float:
     """
     使用量情報からコストを計算
     
     Args:
-        usage_info: {"input_tokens": int, "output_tokens": int, "model": str}
+        usage_info: {"input_tokens": int, "output_tokens": int, "model": str,
+                     "cache_creation_input_tokens": int, "cache_read_input_tokens": int}
+            キャッシュ関連のキーは省略可
     
     Returns:
         float: コスト（USD）
     """
-    model = usage_info.get("model", "")
-    input_tokens = usage_info.get("input_tokens", 0)
-    output_tokens = usage_info.get("output_tokens", 0)
-    
-    # モデル名からプライシング情報を取得
-    pricing = PRICING.get(model)
-    if not pricing:
+    # モデル名から1トークンあたりの単価を取得
+    rates = _RATES_NANO_USD_PER_TOKEN.get(usage_info.get("model", ""))
+    if rates is None:
         return 0.0
     
-    # コスト計算
-    input_cost = (input_tokens / 1_000_000) * pricing["input"]
-    output_cost = (output_tokens / 1_000_000) * pricing["output"]
-    
-    return input_cost + output_cost
+    input_rate, output_rate, cache_write_rate, cache_read_rate = rates
+    total_nano_usd = (
+        usage_info.get("input_tokens", 0) * input_rate
+        + usage_info.get("output_tokens", 0) * output_rate
+        + usage_info.get("cache_creation_input_tokens", 0) * cache_write_rate
+        + usage_info.get("cache_read_input_tokens", 0) * cache_read_rate
+    )
+    return total_nano_usd / 1_000_000_000
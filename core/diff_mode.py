@@ -1,15 +1,16 @@
 import logging
-import io
+import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 from core import llm_service
 from core import utils
-from core.progress_manager import ProgressManager
+from core import progress_manager
 from core.cost_calculator import calculate_cost
 
-def generate_diff_test_spec(new_excel_files, old_structured_md_file, old_test_spec_md_file, granularity: str, job_id: str = None) -> tuple[bytes, dict]:
+def generate_diff_test_spec(new_excel_files, old_structured_md_file, old_test_spec_md_file, granularity: str, job_id: str = None) -> tuple[tempfile.SpooledTemporaryFile, dict]:
     """
-    差分モードでテスト仕様書一式を生成し、ZIPファイルのバイナリデータとトークン統計を返す
+    差分モードでテスト仕様書一式を生成し、ZIPファイルとトークン統計を返す
     
     Args:
         new_excel_files: 新版設計書のExcelファイルリスト
@@ -19,20 +20,29 @@ def generate_diff_test_spec(new_excel_files, old_structured_md_file, old_test_sp
         job_id: ジョブID
     
     Returns:
-        tuple[bytes, dict]: (ZIPファイルのバイナリデータ, トークン統計)
+        tuple[SpooledTemporaryFile, dict]: (ZIPファイル（先頭にシーク済み）, トークン統計)
+            ZIPファイルは呼び出し側でストリーム送信後にclose()すること
     """
     logging.info("差分版テスト生成を開始します。")
-    logging.info(f"Job ID: {job_id}")
+    logging.info("Job ID: %s", job_id)
     
     progress = None
     if job_id:
         try:
-            progress = ProgressManager()
+            # 呼び出し時に参照する（function_appがDurable Functions用の実装に置き換えるため、インポート時に束縛しない）
+            progress = progress_manager.ProgressManager()
             logging.info("ProgressManager初期化成功")
         except Exception as e:
-            logging.error(f"ProgressManager初期化失敗: {e}")
+            logging.error("ProgressManager初期化失敗: %s", e)
             progress = None
     
+    # 旧版ファイルの読み込み（Blobからの取得）は構造化と独立しているため、先行して並列実行する
+    # LLMの同時実行数を制限するllm_serviceのスレッドプールは使わず、読み込み専用の小さいスレッドプールで実行する
+    read_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="old-md")
+    old_structured_future = read_pool.submit(lambda: old_structured_md_file.read().decode('utf-8'))
+    old_test_spec_future = read_pool.submit(lambda: old_test_spec_md_file.read().decode('utf-8'))
+    read_pool.shutdown(wait=False)  # 投入済みの読み込みは完了まで実行され、完了後にスレッドが終了する
+    
     # Step 1: 新版Excelを構造化
     logging.info("新版Excelを構造化中...")
     
@@ -45,59 +55,71 @@ def generate_diff_test_spec(new_excel_files, old_structured_md_file, old_test_sp
     
     # トークン使用量をログ出力
     structuring_cost = calculate_cost(total_usage)
-    logging.info(f"Markdown変換が完了 - 入力トークン: {total_usage['input_tokens']:,}, "
-                 f"出力トークン: {total_usage['output_tokens']:,}, モデル: {total_usage['model']}")
-    logging.info(f"構造化コスト: ${structuring_cost:.4f}")
+    utils.log_usage("Markdown変換が完了", total_usage, "構造化コスト", structuring_cost)
     
     # Step 2: 旧版情報の取得
-    # アップロードされた旧版ファイルを読み込む
+    # Step 1と並行して読み込んだ旧版ファイルの結果を受け取る
     logging.info("旧版ファイルを読み込み中...")
-    old_structured_md = old_structured_md_file.read().decode('utf-8')
-    old_test_spec_md = old_test_spec_md_file.read().decode('utf-8')
+    old_structured_md = old_structured_future.result()
+    old_test_spec_md = old_test_spec_future.result()
+    
+    # 新旧の設計書が同一の場合は差分なしとして、LLM呼び出し（Step 3〜5）を省略し旧版テスト仕様書をそのまま使用する
+    # （同じ設計書を誤ってアップロードした場合などに、空の差分を求めるためのコストを避ける）
+    # 構造化の結果はLLMの出力のため実行ごとに揺れる。構造化設計書に埋め込んだ、構造化前のシート内容のダイジェストで比較する
+    # （ダイジェストのない旧版の構造化設計書は、構造化設計書の全文が一致する場合のみ同一とみなす）
+    new_digest = utils.extract_source_digest(new_structured_md)
+    old_digest = utils.extract_source_digest(old_structured_md)
+    if (old_digest is not None and new_digest == old_digest) or new_structured_md.strip() == old_structured_md.strip():
+        logging.info("新旧の構造化設計書が同一のため、差分検知・観点抽出・仕様書生成をスキップします。")
+        diff_summary = "差分なし"
+        test_perspectives = "（変更なし）"
+        test_spec_md = old_test_spec_md
+        diff_usage = perspectives_usage = testspec_usage = {"input_tokens": 0, "output_tokens": 0, "model": ""}
+        diff_cost = perspectives_cost = testspec_cost = 0.0
+    else:
+        # Step 3: 差分検知
+        if progress:
+            progress.update_progress(job_id, "diff", "差分を検知中...", 40)
+        # LLMを使用して旧版と新版の設計書を比較し、変更点を抽出
+        logging.info("差分検知中...")
+        # 新版設計書はStep 3〜5で共通のため、キャッシュ対象の共通資料として全ステップで同一の形で渡す
+        # （ステップ固有の指示より前に置かれ、接頭辞が一致する後続ステップでキャッシュが再利用される）
+        new_design_context = f"【新版設計書】\n{new_structured_md}"
+        diff_prompt = f"【旧版設計書】\n{old_structured_md}"
+        # 仕様書生成のモデルが異なる場合は、差分検知・観点抽出と並行して仕様書生成用のキャッシュを書き込む（LLM_SPECULATIVE_WARM指定時のみ）
+        warm_future = llm_service.warm_test_spec_cache(new_design_context, with_diff=True)
+        diff_summary, diff_usage = llm_service.detect_diff(diff_prompt, shared_context=new_design_context)
+    
+        diff_cost = calculate_cost(diff_usage)
+        utils.log_usage("差分検知完了", diff_usage, "差分検知コスト", diff_cost)
+    
+        # Step 4: テスト観点抽出（差分考慮）
+        if progress:
+            progress.update_progress(job_id, "perspectives", "テスト観点を抽出中...", 60)
+        # 変更差分を考慮したテスト観点をLLMで抽出
+        logging.info("テスト観点抽出中...")
+        perspectives_prompt = f"【変更差分】\n{diff_summary}"
+        test_perspectives, perspectives_usage = llm_service.extract_perspectives_with_diff(perspectives_prompt, shared_context=new_design_context)
     
-    # Step 3: 差分検知
-    if progress:
-        progress.update_progress(job_id, "diff", "差分を検知中...", 40)
-    # LLMを使用して旧版と新版の設計書を比較し、変更点を抽出
-    logging.info("差分検知中...")
-    diff_prompt = f"【旧版設計書】\n{old_structured_md}\n\n【新版設計書】\n{new_structured_md}"
-    diff_summary, diff_usage = llm_service.detect_diff(diff_prompt)
-    
-    diff_cost = calculate_cost(diff_usage)
-    logging.info(f"差分検知完了 - 入力: {diff_usage['input_tokens']:,}tok, "
-                 f"出力: {diff_usage['output_tokens']:,}tok, モデル: {diff_usage['model']}")
-    logging.info(f"差分検知コスト: ${diff_cost:.4f}")
-    
-    # Step 4: テスト観点抽出（差分考慮）
-    if progress:
-        progress.update_progress(job_id, "perspectives", "テスト観点を抽出中...", 60)
-    # 変更差分を考慮したテスト観点をLLMで抽出
-    logging.info("テスト観点抽出中...")
-    perspectives_prompt = f"【新版設計書】\n{new_structured_md}\n\n【変更差分】\n{diff_summary}"
-    test_perspectives, perspectives_usage = llm_service.extract_perspectives_with_diff(perspectives_prompt)
-    
-    perspectives_cost = calculate_cost(perspectives_usage)
-    logging.info(f"テスト観点抽出完了 - 入力: {perspectives_usage['input_tokens']:,}tok, "
-                 f"出力: {perspectives_usage['output_tokens']:,}tok, モデル: {perspectives_usage['model']}")
-    logging.info(f"観点抽出コスト: ${perspectives_cost:.4f}")
-    
-    # Step 5: テスト仕様書生成（差分・旧版考慮）
-    if progress:
-        progress.update_progress(job_id, "testspec", "テスト仕様書を生成中...", 80)
-    # 新版設計書、変更差分、旧版テスト仕様書を考慮してテスト仕様書を生成
-    logging.info("テスト仕様書生成中...")
-    spec_prompt = (
-        f"【新版設計書】\n{new_structured_md}\n\n"
-        f"【テスト観点】\n{test_perspectives}\n\n"
-        f"【変更差分】\n{diff_summary}\n\n"
-        f"【旧版テスト仕様書】\n{old_test_spec_md}"
-    )
-    test_spec_md, testspec_usage = llm_service.create_test_spec_with_diff(spec_prompt)
-    
-    testspec_cost = calculate_cost(testspec_usage)
-    logging.info(f"テスト仕様書生成完了 - 入力: {testspec_usage['input_tokens']:,}tok, "
-                 f"出力: {testspec_usage['output_tokens']:,}tok, モデル: {testspec_usage['model']}")
-    logging.info(f"仕様書生成コスト: ${testspec_cost:.4f}")
+        perspectives_cost = calculate_cost(perspectives_usage)
+        utils.log_usage("テスト観点抽出完了", perspectives_usage, "観点抽出コスト", perspectives_cost)
+    
+        # Step 5: テスト仕様書生成（差分・旧版考慮）
+        if progress:
+            progress.update_progress(job_id, "testspec", "テスト仕様書を生成中...", 80)
+        # 新版設計書、変更差分、旧版テスト仕様書を考慮してテスト仕様書を生成
+        logging.info("テスト仕様書生成中...")
+        spec_prompt = (
+            f"【テスト観点】\n{test_perspectives}\n\n"
+            f"【変更差分】\n{diff_summary}\n\n"
+            f"【旧版テスト仕様書】\n{old_test_spec_md}"
+        )
+        test_spec_md, testspec_usage = llm_service.create_test_spec_with_diff(spec_prompt, shared_context=new_design_context)
+        if warm_future:
+            utils.add_usage(testspec_usage, warm_future.result())  # キャッシュ先行書き込み分は仕様書生成に計上
+    
+        testspec_cost = calculate_cost(testspec_usage)
+        utils.log_usage("テスト仕様書生成完了", testspec_usage, "仕様書生成コスト", testspec_cost)
     
     # Step 6: 成果物の変換
     if progress:
@@ -109,31 +131,35 @@ def generate_diff_test_spec(new_excel_files, old_structured_md_file, old_test_sp
     # Step 7: ZIP作成
     # 全成果物をZIPファイルにまとめる
     logging.info("ZIP作成中...")
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.writestr("新版_構造化設計書.md", new_structured_md.encode('utf-8'))
-        zip_file.writestr("差分サマリー.md", diff_summary.encode('utf-8'))
-        zip_file.writestr("テスト観点.md", test_perspectives.encode('utf-8'))
-        zip_file.writestr("テスト仕様書.md", test_spec_md.encode('utf-8'))
-        zip_file.writestr("テスト仕様書.xlsx", excel_bytes)
-        zip_file.writestr("テスト仕様書.csv", csv_bytes)
+    # Markdown成果物はstrのまま渡し、書き込み時に1件ずつUTF-8エンコードさせる（エンコード済みの複製を同時に保持しない）
+    payloads = {
+        "新版_構造化設計書.md": new_structured_md,
+        "差分サマリー.md": diff_summary,
+        "テスト観点.md": test_perspectives,
+        "テスト仕様書.md": test_spec_md,
+        "テスト仕様書.csv": csv_bytes
+    }
+    # 小さいZIPはメモリ上、大きいZIPは一時ファイルに書き出す（全体をbytesとして複製しない）
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+b")
+    # テキスト成果物は高速な圧縮レベル1で圧縮し、XLSX（既に圧縮済みのZIP形式）は無圧縮で格納する
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+        for name, data in payloads.items():
+            zip_file.writestr(name, data)
+        zip_file.writestr("テスト仕様書.xlsx", excel_bytes, compress_type=zipfile.ZIP_STORED)
     
     zip_buffer.seek(0)
-    zip_bytes = zip_buffer.read()
     
     # 合計コストを計算
     total_cost = structuring_cost + diff_cost + perspectives_cost + testspec_cost
     
     logging.info("差分版ZIPファイルの作成が完了しました。")
-    logging.info(f"=== 合計コスト: ${total_cost:.4f} ===")
+    logging.info("=== 合計コスト: $%.4f ===", total_cost)
     
     # トークン統計を集計
-    token_stats = {
-        "total_input_tokens": total_usage["input_tokens"] + diff_usage["input_tokens"] + perspectives_usage["input_tokens"] + testspec_usage["input_tokens"],
-        "total_output_tokens": total_usage["output_tokens"] + diff_usage["output_tokens"] + perspectives_usage["output_tokens"] + testspec_usage["output_tokens"]
-    }
+    token_stats = utils.summarize_token_stats(total_usage, diff_usage, perspectives_usage, testspec_usage)
     
     if progress:
         progress.update_progress(job_id, "completed", "完了しました", 100)
+        progress.flush()  # 完了の進捗は戻る前に確実に書き込む
     
-    return zip_bytes, token_stats
+    return zip_buffer, token_stats
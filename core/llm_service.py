@@ -1,11 +1,18 @@
 import logging
 import os
+import random
+import threading
 import time
-from anthropic import AnthropicFoundry
-from dotenv import load_dotenv
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from core import response_cache
 
 from prompts import (
     STRUCTURING_PROMPT, 
+    STRUCTURING_BATCH_DELIMITER,
+    STRUCTURING_BATCH_INSTRUCTION,
     EXTRACT_TEST_PERSPECTIVES_PROMPT, 
     CREATE_TEST_SPEC_PROMPT_SIMPLE,
     CREATE_TEST_SPEC_PROMPT_DETAILED,
@@ -14,21 +21,79 @@ from prompts import (
     CREATE_TEST_SPEC_PROMPT_WITH_DIFF
 )
 
-# .envファイルから環境変数を読み込む
-load_dotenv()
+# anthropicのインポートは1秒以上かかるため、LLMを呼び出すまで遅延する（進捗取得などのHTTP関数のコールドスタート短縮）
+if TYPE_CHECKING:
+    from anthropic import AnthropicFoundry
+
+# 接続情報・モデル選択の必須環境変数（validate_envで確認する）
+REQUIRED_CONFIG_KEYS = (
+    "azure_api_key", "azure_endpoint",
+    "model_structuring", "model_test_perspectives", "model_test_spec", "model_diff_detection"
+)
+
+def _get_int_env(name: str, default: int) -> int:
+    """整数の環境変数を取得（未設定・空文字（.env.exampleのまま）の場合は既定値）"""
+    return int(os.getenv(name) or default)
+
+@lru_cache(maxsize=1)
+def get_config() -> dict:
+    """接続情報・モデル選択・動作設定の環境変数を読み込む
+    
+    初回呼び出し時のみ環境変数を参照し、以降はキャッシュを返す。
+    モジュール読み込み時には参照しないため、インポート後に設定された環境変数も反映される。
+    （.envファイルはcoreパッケージの読み込み時に読み込み済み）
+    
+    Returns:
+        dict: 接続情報・モデル名・動作設定
+    """
+    return {
+        # --- Anthropic SDK 接続情報 ---
+        "azure_api_key": os.getenv("AZURE_FOUNDRY_API_KEY"),
+        "azure_endpoint": os.getenv("AZURE_FOUNDRY_ENDPOINT"),
+        # --- モデル選択 ---
+        "model_structuring": os.getenv("MODEL_STRUCTURING"),
+        "model_test_perspectives": os.getenv("MODEL_TEST_PERSPECTIVES"),
+        "model_test_spec": os.getenv("MODEL_TEST_SPEC"),
+        "model_diff_detection": os.getenv("MODEL_DIFF_DETECTION"),
+        # --- 並列実行設定 ---
+        # LLM呼び出しを並列実行するスレッド数
+        "max_concurrency": _get_int_env("LLM_MAX_CONCURRENCY", 4),
+        # --- リトライ設定 ---
+        # 1回のLLM呼び出しでリトライ待機に使える合計時間の上限（秒）。超える場合はリトライ回数が残っていても失敗とする
+        "retry_deadline_seconds": _get_int_env("LLM_RETRY_DEADLINE_SECONDS", 900),
+        # --- プロンプトキャッシュの先行書き込み設定 ---
+        # 有効にすると、テスト観点抽出と並行して、テスト仕様書生成用のキャッシュ（共通資料＋システムプロンプト）を書き込む
+        # キャッシュはモデルごとに保持されるため、観点抽出と仕様書生成のモデルが異なる場合のみ実行する
+        "speculative_warm": os.getenv("LLM_SPECULATIVE_WARM", "").lower() in ("1", "true", "yes"),
+        # --- シート構造化のバッチ設定 ---
+        # 1回のLLM呼び出しにまとめるシートの合計文字数上限（出力もほぼ同量になるため、max_tokensに収まる範囲とする）
+        # 0以下の場合はバッチ化せず、シートごとに呼び出す
+        "structuring_batch_max_chars": _get_int_env("STRUCTURING_BATCH_MAX_CHARS", 20000),
+        # 1回のLLM呼び出しで構造化する1シートの文字数上限（超えるシートは行単位で分割して構造化する）
+        # 出力もほぼ同量になるため、max_tokensに収まる範囲とする。0以下の場合は分割しない
+        "structuring_sheet_max_chars": _get_int_env("STRUCTURING_SHEET_MAX_CHARS", 20000)
+    }
 
-# --- Anthropic SDK 接続情報 ---
-azure_api_key = os.getenv("AZURE_FOUNDRY_API_KEY")
-azure_endpoint = os.getenv("AZURE_FOUNDRY_ENDPOINT")
+# LLM呼び出しはI/O待ちが支配的なため、スレッドで並列化する（スレッド起動コストを償却するためモジュール単位で共有）
+_executor = None  # 遅延初期化（get_executorで生成）
+_executor_lock = threading.Lock()  # 並列呼び出し時の二重生成防止
 
-# --- モデル選択 ---
-model_structuring = os.getenv("MODEL_STRUCTURING")
-model_test_perspectives = os.getenv("MODEL_TEST_PERSPECTIVES")
-model_test_spec = os.getenv("MODEL_TEST_SPEC")
-model_diff_detection = os.getenv("MODEL_DIFF_DETECTION")
+def get_executor() -> ThreadPoolExecutor:
+    """LLM呼び出し用のスレッドプールを取得（初回呼び出し時にLLM_MAX_CONCURRENCYのスレッド数で生成）
+    
+    Returns:
+        ThreadPoolExecutor: LLM呼び出し用のスレッドプール
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_config()["max_concurrency"], thread_name_prefix="llm")
+    return _executor
 
 # LLMクライアントの初期化用変数（遅延初期化）
 anthropic_client = None
+_client_lock = threading.Lock()  # 並列呼び出し時の二重初期化防止
 
 def validate_env():
     """必須環境変数のチェック関数
@@ -36,8 +101,8 @@ def validate_env():
     Raises:
         ValueError: 必須環境変数が不足している場合
     """
-    required = [azure_api_key, azure_endpoint, model_structuring, model_test_perspectives, model_test_spec, model_diff_detection]
-    if not all(required):
+    config = get_config()
+    if not all(config[key] for key in REQUIRED_CONFIG_KEYS):
         raise ValueError("Anthropic の必須環境変数が設定されていません。")
 
 def initialize_client():
@@ -45,82 +110,179 @@ def initialize_client():
     
     初回呼び出し時のみ実行される（遅延初期化）
     """
+    from anthropic import AnthropicFoundry, Timeout
+    
     global anthropic_client
     validate_env()
+    config = get_config()
     
     # Anthropic SDK のクライアントを初期化
+    # クライアントはモジュール単位で共有し、SDK内部のHTTP接続プール（keep-alive）でTCP/TLSハンドシェイクを再利用する
+    # リトライはcall_llm側のループで制御するため、SDK内部のリトライは無効化（二重バックオフ防止）
     anthropic_client = AnthropicFoundry(
-        api_key=azure_api_key,
-        base_url=azure_endpoint
+        api_key=config["azure_api_key"],
+        base_url=config["azure_endpoint"],
+        timeout=Timeout(600.0, connect=30.0),
+        max_retries=0
     )
 
-def call_llm(system_prompt: str, user_prompt: str, model: str, max_retries: int = 10) -> tuple[str, dict]:
+def is_retriable_error(e: Exception) -> bool:
+    """リトライで解消する可能性のあるエラーかどうかを判定
+    
+    Args:
+        e: API呼び出しで発生した例外
+    
+    Returns:
+        bool: レート制限（429）、タイムアウト（408）、過負荷（529）、5xx、接続エラーの場合True
+    """
+    from anthropic import APIConnectionError, APIStatusError, RateLimitError
+    
+    if isinstance(e, (RateLimitError, APIConnectionError)):
+        return True
+    if isinstance(e, APIStatusError):
+        # ストリーミング途中のエラーイベントはHTTP 200のまま通知されるため、エラー種別でも判定する
+        error_type = (e.body or {}).get("error", {}).get("type") if isinstance(e.body, dict) else None
+        return e.status_code in (408, 429) or e.status_code >= 500 or error_type in ("rate_limit_error", "overloaded_error")
+    return False
+
+def get_retry_after(e: Exception, max_wait: float = 120) -> float | None:
+    """エラーレスポンスのRetry-Afterヘッダーから待機秒数を取得
+    
+    Args:
+        e: API呼び出しで発生した例外
+        max_wait: 待機秒数の上限
+    
+    Returns:
+        float | None: 待機秒数（ヘッダーがない・解釈できない場合はNone）
+    """
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    try:
+        return min(float(response.headers.get("retry-after")), max_wait)
+    except (TypeError, ValueError):
+        return None
+
+def build_system_blocks(system_prompt: str, shared_context: str = None) -> list[dict]:
+    """システムプロンプトのブロック列を組み立てる
+    
+    プロンプトキャッシュは「system → messages」の順の接頭辞一致で判定されるため、
+    複数ステップで共通する資料（shared_context）はステップ固有の指示より前に置き、
+    指示が異なるステップ間でもキャッシュが再利用されるようにする。
+    
+    Args:
+        system_prompt: ステップ固有のシステムプロンプト
+        shared_context: 複数ステップで共通する資料（省略可）
+    
+    Returns:
+        list[dict]: systemに渡すブロック列（各ブロックにcache_controlを付与）
+    """
+    blocks = []
+    if shared_context:
+        blocks.append({"type": "text", "text": shared_context, "cache_control": {"type": "ephemeral"}})
+    blocks.append({"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}})
+    return blocks
+
+def get_client() -> "AnthropicFoundry":
+    """LLMクライアントを取得（未初期化の場合は初期化）
+    
+    Returns:
+        AnthropicFoundry: Anthropic SDK のクライアント
+    """
+    if anthropic_client is None:
+        with _client_lock:
+            if anthropic_client is None:
+                initialize_client()
+    return anthropic_client
+
+def call_llm(system_prompt: str, user_prompt: str, model: str, max_retries: int = 10, shared_context: str = None) -> tuple[str, dict]:
     """
     Anthropic SDK を呼び出す共通関数
     
+    システムプロンプトと共通資料は、プロンプトキャッシュ（cache_control）を有効にして送信する。
+    
     Args:
         system_prompt: システムプロンプト（LLMの役割や指示）
         user_prompt: ユーザープロンプト（実際の入力データ）
         model: 使用するモデル名
-        max_retries: レート制限エラー時の最大リトライ回数
+        max_retries: 一時エラー（レート制限・過負荷など）時の最大リトライ回数
+        shared_context: 複数ステップで共通する資料（キャッシュ対象としてシステムプロンプトの前に置く、省略可）
     
     Returns:
         tuple[str, dict]: (LLMからの応答テキスト, 使用量情報)
-            使用量情報: {"input_tokens": int, "output_tokens": int, "model": str}
+            使用量情報: {"input_tokens": int, "output_tokens": int,
+                         "cache_creation_input_tokens": int, "cache_read_input_tokens": int, "model": str}
     
     Raises:
         RuntimeError: API呼び出しに失敗した場合
     """
-    global anthropic_client
+    # 応答キャッシュ（LLM_CACHE_ENABLED指定時のみ）にヒットした場合はAPIを呼び出さない
+    cache_key = None
+    if response_cache.CACHE_ENABLED:
+        cache_key = response_cache.make_key(model, system_prompt, user_prompt, shared_context)
+        cached = response_cache.load(cache_key)
+        if cached is not None:
+            logging.info("LLM応答キャッシュにヒットしました")
+            # キャッシュヒット時は課金が発生しないため、使用量は0として返す
+            return cached["result"], {"input_tokens": 0, "output_tokens": 0,
+                                          "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "model": model}
     
-    # クライアントが未初期化の場合は初期化
-    if anthropic_client is None:
-        initialize_client()
+    from anthropic import RateLimitError
+    
+    client = get_client()
+    deadline = time.monotonic() + get_config()["retry_deadline_seconds"]
     
     for attempt in range(max_retries):
         try:
             # Anthropic SDK を呼び出し（ストリーミング有効）
-            result = ""
-            input_tokens = 0
-            output_tokens = 0
-            
-            with anthropic_client.messages.stream(
+            with client.messages.stream(
                 model=model,
                 max_tokens=64000,
-                system=system_prompt,
+                system=build_system_blocks(system_prompt, shared_context),
                 messages=[
                     {"role": "user", "content": user_prompt}
                 ]
             ) as stream:
-                for text in stream.text_stream:
-                    result += text
+                # 文字列連結によるO(N^2)コピーを避けるため、チャンクをまとめて一度に結合
+                # 応答途中で失敗した場合は受信済みのチャンクを破棄し、最初から呼び出し直す
+                result = "".join(stream.text_stream)
                 
                 # 最終メッセージから使用量情報を取得
                 message = stream.get_final_message()
-                input_tokens = message.usage.input_tokens
-                output_tokens = message.usage.output_tokens
             
-            usage_info = {
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
+            usage = {
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens,
+                # キャッシュ書き込み・読み込みトークン（キャッシュ未使用時はNoneになるため0に正規化）
+                "cache_creation_input_tokens": getattr(message.usage, "cache_creation_input_tokens", 0) or 0,
+                "cache_read_input_tokens": getattr(message.usage, "cache_read_input_tokens", 0) or 0,
                 "model": model
             }
-            return result, usage_info
-
+            
+            if cache_key:
+                response_cache.save(cache_key, result, usage)
+            return result, usage
+        
         except Exception as e:
-            # レート制限エラーの場合はリトライ
-            if "rate_limit" in str(e).lower() or "429" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = min((2 ** attempt) * 3 + (attempt * 5), 120)
-                    logging.warning(f"Anthropic API レート制限エラー。{wait_time}秒後にリトライします（{attempt + 1}/{max_retries}）")
+            # リトライ可能なエラー（レート制限・過負荷・サーバーエラー・接続エラー、応答途中の切断を含む）の場合はリトライ
+            if is_retriable_error(e):
+                # 同時に失敗したジョブのリトライが揃わないよう、上限付き指数バックオフにジッターを加える
+                # サーバーがRetry-Afterを返した場合はそれを優先する
+                wait_time = get_retry_after(e)
+                if wait_time is None:
+                    wait_time = random.uniform(0, min(120, 3 * 2 ** attempt))
+                # 待機後に合計待機時間の上限を超える場合はリトライしない
+                if attempt < max_retries - 1 and time.monotonic() + wait_time < deadline:
+                    logging.warning("Anthropic API 一時エラー（%s）。%.1f秒後にリトライします（%d/%d）", type(e).__name__, wait_time, attempt + 1, max_retries)
                     time.sleep(wait_time)
                     continue
                 else:
-                    logging.error("Anthropic API呼び出しが最大リトライ回数に達しました")
-                    raise RuntimeError("Anthropic APIのレート制限エラー。時間をおいて再試行してください。")
+                    logging.error("Anthropic API呼び出しが最大リトライ回数または待機時間の上限に達しました")
+                    if isinstance(e, RateLimitError):
+                        raise RuntimeError("Anthropic APIのレート制限エラー。時間をおいて再試行してください。")
             
-            # その他のエラー
-            logging.error(f"Anthropic API呼び出し中にエラーが発生しました: {str(e)}")
+            # その他のエラー（400/401/403/404/422など、リトライしても解消しないもの）
+            logging.error("Anthropic API呼び出し中にエラーが発生しました: %s", e)
             raise RuntimeError(f"Anthropic API呼び出しに失敗しました: {str(e)}")
     
     raise RuntimeError("Anthropic API呼び出しに失敗しました")
@@ -134,49 +296,156 @@ def structuring(prompt: str) -> tuple[str, dict]:
     Returns:
         tuple[str, dict]: (構造化されたMarkdown, 使用量情報)
     """
-    return call_llm(STRUCTURING_PROMPT, prompt, model_structuring)
+    return call_llm(STRUCTURING_PROMPT, prompt, get_config()["model_structuring"])
 
-def extract_test_perspectives(prompt: str) -> tuple[str, dict]:
+def structuring_batch(prompts: list[str]) -> tuple[list[str], dict]:
+    """複数シートの生データを1回のLLM呼び出しでまとめて構造化
+    
+    シートごとに呼び出す場合に比べ、システムプロンプト分の入力トークンと往復回数を削減する。
+    応答を区切り行で分割した結果がシート数と一致しない場合は、シートごとの呼び出しにフォールバックする。
+    
+    Args:
+        prompts: シートごとの構造化プロンプトのリスト
+    
+    Returns:
+        tuple[list[str], dict]: (シートごとの構造化されたMarkdown, 合計使用量情報)
+    """
+    if len(prompts) == 1:
+        content, usage = structuring(prompts[0])
+        return [content], usage
+    
+    batch_prompt = "\n\n".join(f"{STRUCTURING_BATCH_DELIMITER}\n{prompt}" for prompt in prompts)
+    result, usage = call_llm(STRUCTURING_PROMPT + STRUCTURING_BATCH_INSTRUCTION, batch_prompt, get_config()["model_structuring"])
+    
+    # 先頭の区切り行より前（空文字列）を除いてシートごとに分割
+    sections = [section.strip() for section in result.split(STRUCTURING_BATCH_DELIMITER)[1:]]
+    if len(sections) == len(prompts):
+        return sections, usage
+    
+    # 区切り行の数が一致しない場合はシートごとに構造化し直す（失敗したバッチ呼び出し分の使用量も計上）
+    logging.warning("バッチ構造化の応答をシート単位に分割できませんでした（期待: %d, 実際: %d）。シートごとに再実行します。", len(prompts), len(sections))
+    total_usage = dict(usage)
+    contents = []
+    for prompt in prompts:
+        content, sheet_usage = structuring(prompt)
+        contents.append(content)
+        for key in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+            # レスポンスキャッシュのヒット時はキャッシュ系のキーを含まないため、両辺とも欠損を0として扱う
+            total_usage[key] = total_usage.get(key, 0) + sheet_usage.get(key, 0)
+    return contents, total_usage
+
+def extract_test_perspectives(prompt: str, shared_context: str = None) -> tuple[str, dict]:
     """設計書からAIでテスト観点を抽出
     
+    Args:
+        prompt: 観点抽出の指示（設計書をshared_contextで渡さない場合は設計書を含むプロンプト）
+        shared_context: ステップ間で共通の資料（設計書）
+    
     Returns:
         tuple[str, dict]: (テスト観点, 使用量情報)
     """
-    return call_llm(EXTRACT_TEST_PERSPECTIVES_PROMPT, prompt, model_test_perspectives)
+    return call_llm(EXTRACT_TEST_PERSPECTIVES_PROMPT, prompt, get_config()["model_test_perspectives"], shared_context=shared_context)
 
-def create_test_spec(prompt: str, granularity: str = "simple") -> tuple[str, dict]:
+def create_test_spec(prompt: str, granularity: str = "simple", shared_context: str = None) -> tuple[str, dict]:
     """テスト仕様書を生成
     
     Args:
-        prompt: 設計書とテスト観点を含むプロンプト
+        prompt: テスト観点を含むプロンプト（設計書をshared_contextで渡さない場合は設計書も含める）
         granularity: テスト粒度（"simple" or "detailed"）
+        shared_context: ステップ間で共通の資料（設計書）
     
     Returns:
         tuple[str, dict]: (テスト仕様書, 使用量情報)
     """
     system_prompt = CREATE_TEST_SPEC_PROMPT_DETAILED if granularity == "detailed" else CREATE_TEST_SPEC_PROMPT_SIMPLE
-    return call_llm(system_prompt, prompt, model_test_spec)
+    return call_llm(system_prompt, prompt, get_config()["model_test_spec"], shared_context=shared_context)
 
-def detect_diff(prompt: str) -> tuple[str, dict]:
+def detect_diff(prompt: str, shared_context: str = None) -> tuple[str, dict]:
     """旧版と新版の設計書から差分を検知
     
+    Args:
+        prompt: 旧版設計書を含むプロンプト
+        shared_context: ステップ間で共通の資料（新版設計書）
+    
     Returns:
         tuple[str, dict]: (差分サマリー, 使用量情報)
     """
-    return call_llm(DIFF_DETECTION_PROMPT, prompt, model_diff_detection)
+    return call_llm(DIFF_DETECTION_PROMPT, prompt, get_config()["model_diff_detection"], shared_context=shared_context)
 
-def extract_perspectives_with_diff(prompt: str) -> tuple[str, dict]:
+def extract_perspectives_with_diff(prompt: str, shared_context: str = None) -> tuple[str, dict]:
     """差分を考慮してテスト観点を抽出（差分モード用）
     
+    Args:
+        prompt: 変更差分を含むプロンプト
+        shared_context: ステップ間で共通の資料（新版設計書）
+    
     Returns:
         tuple[str, dict]: (テスト観点, 使用量情報)
     """
-    return call_llm(EXTRACT_TEST_PERSPECTIVES_PROMPT_WITH_DIFF, prompt, model_test_perspectives)
+    return call_llm(EXTRACT_TEST_PERSPECTIVES_PROMPT_WITH_DIFF, prompt, get_config()["model_test_perspectives"], shared_context=shared_context)
 
-def create_test_spec_with_diff(prompt: str) -> tuple[str, dict]:
+def create_test_spec_with_diff(prompt: str, shared_context: str = None) -> tuple[str, dict]:
     """差分と旧版仕様書を考慮してテスト仕様書を生成（差分モード用）
     
+    Args:
+        prompt: テスト観点・変更差分・旧版テスト仕様書を含むプロンプト
+        shared_context: ステップ間で共通の資料（新版設計書）
+    
     Returns:
         tuple[str, dict]: (テスト仕様書, 使用量情報)
     """
-    return call_llm(CREATE_TEST_SPEC_PROMPT_WITH_DIFF, prompt, model_test_spec)
+    return call_llm(CREATE_TEST_SPEC_PROMPT_WITH_DIFF, prompt, get_config()["model_test_spec"], shared_context=shared_context)
+
+def warm_prompt_cache(system_prompt: str, model: str, shared_context: str = None) -> dict:
+    """システムプロンプトと共通資料をプロンプトキャッシュに書き込む（出力1トークンの呼び出し）
+    
+    後続の呼び出しと同じsystemブロックを送信し、その呼び出しの接頭辞を事前にキャッシュさせる。
+    失敗しても後続の呼び出しは通常どおり実行できるため、例外は送出しない。
+    
+    Args:
+        system_prompt: 後続の呼び出しのシステムプロンプト
+        model: 後続の呼び出しのモデル名
+        shared_context: 後続の呼び出しの共通資料（省略可）
+    
+    Returns:
+        dict: 使用量情報（失敗した場合はすべて0）
+    """
+    try:
+        message = get_client().messages.create(
+            model=model,
+            max_tokens=1,
+            system=build_system_blocks(system_prompt, shared_context),
+            messages=[{"role": "user", "content": "."}]
+        )
+    except Exception as e:
+        logging.warning("プロンプトキャッシュの先行書き込みに失敗しました: %s", e)
+        return {"input_tokens": 0, "output_tokens": 0, "model": model}
+    return {
+        "input_tokens": message.usage.input_tokens,
+        "output_tokens": message.usage.output_tokens,
+        "cache_creation_input_tokens": getattr(message.usage, "cache_creation_input_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(message.usage, "cache_read_input_tokens", 0) or 0,
+        "model": model
+    }
+
+def warm_test_spec_cache(shared_context: str, granularity: str = "simple", with_diff: bool = False) -> Future | None:
+    """テスト仕様書生成用のプロンプトキャッシュの先行書き込みを開始（LLM_SPECULATIVE_WARM指定時のみ）
+    
+    テスト観点抽出の実行中に仕様書生成の接頭辞をキャッシュさせ、仕様書生成の初回トークンまでの時間を短縮する。
+    
+    Args:
+        shared_context: ステップ間で共通の資料（設計書）
+        granularity: テスト粒度（"simple" or "detailed"、通常モードのみ）
+        with_diff: 差分モードかどうか
+    
+    Returns:
+        Future | None: warm_prompt_cacheの実行結果（使用量情報）。実行しない場合はNone
+    """
+    config = get_config()
+    if not config["speculative_warm"] or config["model_test_spec"] == config["model_test_perspectives"]:
+        return None
+    if with_diff:
+        system_prompt = CREATE_TEST_SPEC_PROMPT_WITH_DIFF
+    else:
+        system_prompt = CREATE_TEST_SPEC_PROMPT_DETAILED if granularity == "detailed" else CREATE_TEST_SPEC_PROMPT_SIMPLE
+    return get_executor().submit(warm_prompt_cache, system_prompt, config["model_test_spec"], shared_context)
@@ -1,16 +1,16 @@
 import logging
-import io
+import tempfile
 import zipfile
 from pathlib import Path
 
 from core import llm_service
 from core import utils
-from core.progress_manager import ProgressManager
+from core import progress_manager
 from core.cost_calculator import calculate_cost
 
-def generate_normal_test_spec(files, granularity: str, job_id: str = None) -> tuple[bytes, dict]:
+def generate_normal_test_spec(files, granularity: str, job_id: str = None) -> tuple[tempfile.SpooledTemporaryFile, dict]:
     """
-    通常モードでテスト仕様書一式を生成し、ZIPファイルのバイナリデータとトークン統計を返す
+    通常モードでテスト仕様書一式を生成し、ZIPファイルとトークン統計を返す
     
     Args:
         files: アップロードされたExcelファイルのリスト
@@ -18,18 +18,20 @@ def generate_normal_test_spec(files, granularity: str, job_id: str = None) -> tu
         job_id: ジョブID
     
     Returns:
-        tuple[bytes, dict]: (ZIPファイルのバイナリデータ, トークン統計)
+        tuple[SpooledTemporaryFile, dict]: (ZIPファイル（先頭にシーク済み）, トークン統計)
+            ZIPファイルは呼び出し側でストリーム送信後にclose()すること
     """
-    logging.info(f"{len(files)}件のファイルから単体テスト生成（通常版）を開始します。")
-    logging.info(f"Job ID: {job_id}")
+    logging.info("%d件のファイルから単体テスト生成（通常版）を開始します。", len(files))
+    logging.info("Job ID: %s", job_id)
     
     progress = None
     if job_id:
         try:
-            progress = ProgressManager()
+            # 呼び出し時に参照する（function_appがDurable Functions用の実装に置き換えるため、インポート時に束縛しない）
+            progress = progress_manager.ProgressManager()
             logging.info("ProgressManager初期化成功")
         except Exception as e:
-            logging.error(f"ProgressManager初期化失敗: {e}")
+            logging.error("ProgressManager初期化失敗: %s", e)
             progress = None
     
     # --- 1. Excelファイル群をMarkdownに変換 ---
@@ -44,33 +46,34 @@ def generate_normal_test_spec(files, granularity: str, job_id: str = None) -> tu
     
     # トークン使用量をログ出力
     structuring_cost = calculate_cost(total_usage)
-    logging.info(f"Markdown変換が完了 - 入力トークン: {total_usage['input_tokens']:,}, "
-                 f"出力トークン: {total_usage['output_tokens']:,}, モデル: {total_usage['model']}")
-    logging.info(f"構造化コスト: ${structuring_cost:.4f}")
+    utils.log_usage("Markdown変換が完了", total_usage, "構造化コスト", structuring_cost)
     
     # --- 2. AIによるテスト観点抽出 ---
     if progress:
         progress.update_progress(job_id, "perspectives", "テスト観点を抽出中...", 40)
     logging.info("テスト観点を抽出中...")
-    extract_perspectives_prompt = f"--- 設計書 ---\n{md_output_first}"
-    md_output_second, perspectives_usage = llm_service.extract_test_perspectives(extract_perspectives_prompt)
+    # 設計書はStep 2〜3で共通のため、キャッシュ対象の共通資料として同一の形で渡す
+    # （ステップ固有の入力より前に置かれ、Step 3でキャッシュが再利用される）
+    design_context = f"--- 設計書 ---\n{md_output_first}"
+    # 仕様書生成のモデルが異なる場合は、観点抽出と並行して仕様書生成用のキャッシュを書き込む（LLM_SPECULATIVE_WARM指定時のみ）
+    warm_future = llm_service.warm_test_spec_cache(design_context, granularity)
+    extract_perspectives_prompt = "上記の設計書からテスト観点を抽出してください。"
+    md_output_second, perspectives_usage = llm_service.extract_test_perspectives(extract_perspectives_prompt, shared_context=design_context)
     
     perspectives_cost = calculate_cost(perspectives_usage)
-    logging.info(f"テスト観点抽出完了 - 入力: {perspectives_usage['input_tokens']:,}tok, "
-                 f"出力: {perspectives_usage['output_tokens']:,}tok, モデル: {perspectives_usage['model']}")
-    logging.info(f"観点抽出コスト: ${perspectives_cost:.4f}")
+    utils.log_usage("テスト観点抽出完了", perspectives_usage, "観点抽出コスト", perspectives_cost)
 
     # --- 3. AIによるテスト仕様書生成 ---
     if progress:
         progress.update_progress(job_id, "testspec", "テスト仕様書を生成中...", 70)
     logging.info("テスト仕様書を生成中...")
-    test_gen_prompt = f"--- 設計書 ---\n{md_output_first}\n\n--- テスト観点 ---\n{md_output_second}"
-    md_output_third, testspec_usage = llm_service.create_test_spec(test_gen_prompt, granularity)
+    test_gen_prompt = f"--- テスト観点 ---\n{md_output_second}"
+    md_output_third, testspec_usage = llm_service.create_test_spec(test_gen_prompt, granularity, shared_context=design_context)
+    if warm_future:
+        utils.add_usage(testspec_usage, warm_future.result())  # キャッシュ先行書き込み分は仕様書生成に計上
     
     testspec_cost = calculate_cost(testspec_usage)
-    logging.info(f"テスト仕様書生成完了 - 入力: {testspec_usage['input_tokens']:,}tok, "
-                 f"出力: {testspec_usage['output_tokens']:,}tok, モデル: {testspec_usage['model']}")
-    logging.info(f"仕様書生成コスト: ${testspec_cost:.4f}")
+    utils.log_usage("テスト仕様書生成完了", testspec_usage, "仕様書生成コスト", testspec_cost)
 
     # --- 4. 成果物の変換 ---
     if progress:
@@ -84,31 +87,35 @@ def generate_normal_test_spec(files, granularity: str, job_id: str = None) -> tu
     logging.info("全成果物をZIPファイルにまとめています。")
     # ファイル名のベース名を決定（単一ファイルの場合はそのファイル名、複数の場合は"設計書"）
     base_name = Path(files[0].filename).stem if len(files) == 1 else "設計書"
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+    # Markdown成果物はstrのまま渡し、書き込み時に1件ずつUTF-8エンコードさせる（エンコード済みの複製を同時に保持しない）
+    payloads = {
+        f"{base_name}_構造化設計書.md": md_output_first,
+        f"{base_name}_テスト観点.md": md_output_second,
+        f"{base_name}_テスト仕様書.md": md_output_third,
+        f"{base_name}_テスト仕様書.csv": csv_bytes
+    }
+    # 小さいZIPはメモリ上、大きいZIPは一時ファイルに書き出す（全体をbytesとして複製しない）
+    zip_buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode="w+b")
+    # テキスト成果物は高速な圧縮レベル1で圧縮し、XLSX（既に圧縮済みのZIP形式）は無圧縮で格納する
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
         # 各成果物をZIPに追加
-        zip_file.writestr(f"{base_name}_構造化設計書.md", md_output_first.encode('utf-8'))
-        zip_file.writestr(f"{base_name}_テスト観点.md", md_output_second.encode('utf-8'))
-        zip_file.writestr(f"{base_name}_テスト仕様書.md", md_output_third.encode('utf-8'))
-        zip_file.writestr(f"{base_name}_テスト仕様書.xlsx", excel_bytes)
-        zip_file.writestr(f"{base_name}_テスト仕様書.csv", csv_bytes)
+        for name, data in payloads.items():
+            zip_file.writestr(name, data)
+        zip_file.writestr(f"{base_name}_テスト仕様書.xlsx", excel_bytes, compress_type=zipfile.ZIP_STORED)
     
     zip_buffer.seek(0)
-    zip_bytes = zip_buffer.read()
     
     # 合計コストを計算
     total_cost = structuring_cost + perspectives_cost + testspec_cost
     
     logging.info("ZIPファイルの作成が完了しました。")
-    logging.info(f"=== 合計コスト: ${total_cost:.4f} ===")
+    logging.info("=== 合計コスト: $%.4f ===", total_cost)
     
     # トークン統計を集計
-    token_stats = {
-        "total_input_tokens": total_usage["input_tokens"] + perspectives_usage["input_tokens"] + testspec_usage["input_tokens"],
-        "total_output_tokens": total_usage["output_tokens"] + perspectives_usage["output_tokens"] + testspec_usage["output_tokens"]
-    }
+    token_stats = utils.summarize_token_stats(total_usage, perspectives_usage, testspec_usage)
     
     if progress:
         progress.update_progress(job_id, "completed", "完了しました", 100)
+        progress.flush()  # 完了の進捗は戻る前に確実に書き込む
     
-    return zip_bytes, token_stats
+    return zip_buffer, token_stats
@@ -1,6 +1,10 @@
 import json
 import os
 import logging
+import threading
+import time
+from functools import lru_cache
+from azure.core.exceptions import ResourceExistsError
 from azure.storage.blob import BlobServiceClient
 from datetime import datetime, timedelta
 
@@ -8,38 +12,98 @@ from datetime import datetime, timedelta
 logging.getLogger('azure.core.pipeline.policies.http_logging_policy').setLevel(logging.WARNING)
 logging.getLogger('azure.storage.blob').setLevel(logging.WARNING)
 
+# 進捗のBlob書き込み間隔（秒）。この間に発生した更新はジョブごとに最新のもののみ書き込む
+FLUSH_INTERVAL_SECONDS = 0.5
+
+@lru_cache(maxsize=None)
+def get_blob_service_client(purpose: str = "progress") -> BlobServiceClient:
+    """BlobServiceClientを取得（用途ごとに初回のみ生成し、プロセス内で共有）
+    
+    インスタンスごとにクライアントを生成すると、HTTP接続プールが共有されずTLSハンドシェイクが毎回発生するため、
+    プロセス内で同じクライアントを使用する。
+    
+    Args:
+        purpose: 用途（"progress": 進捗情報, "data": 生成結果）
+            PROGRESS_BLOB_CONNECTION_STRING / USER_BLOB_CONNECTION_STRING が未設定の場合は
+            AZURE_STORAGE_CONNECTION_STRINGを使用する
+    
+    Returns:
+        BlobServiceClient: Blob Storageクライアント
+    """
+    env_name = "PROGRESS_BLOB_CONNECTION_STRING" if purpose == "progress" else "USER_BLOB_CONNECTION_STRING"
+    connection_string = os.getenv(env_name) or os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    if not connection_string:
+        raise ValueError("AZURE_STORAGE_CONNECTION_STRINGが設定されていません")
+    
+    return BlobServiceClient.from_connection_string(
+        connection_string,
+        logging_enable=False  # SDKの詳細ログを無効化
+    )
+
 class ProgressManager:
+    """進捗情報をBlob Storageに保存する（Durable Functions上ではfunction_appのDurableProgressManagerに置き換えられる）"""
+    _container_ready = False  # コンテナ作成済みかどうか（プロセス内で共有）
+    
     def __init__(self):
-        connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        if not connection_string:
-            raise ValueError("AZURE_STORAGE_CONNECTION_STRINGが設定されていません")
-        
-        self.blob_service_client = BlobServiceClient.from_connection_string(
-            connection_string,
-            logging_enable=False  # SDKの詳細ログを無効化
-        )
+        self.blob_service_client = get_blob_service_client()
         self.container_name = "progress"
         self._ensure_container()
+        # 進捗更新はバックグラウンドスレッドでまとめて書き込む（呼び出し元の処理をBlob書き込みで止めない）
+        self._pending = {}  # job_id -> 未書き込みの最新の進捗
+        self._lock = threading.Lock()
+        self._upload_lock = threading.Lock()  # 書き込み順序を保つため、書き込みは同時に1つだけ行う
+        self._worker = None
     
     def _ensure_container(self):
+        # コンテナ作成の往復はプロセスごとに1回だけ行う
+        if ProgressManager._container_ready:
+            return
         try:
             self.blob_service_client.create_container(self.container_name)
-        except:
+        except ResourceExistsError:
             pass
+        ProgressManager._container_ready = True
     
     def update_progress(self, job_id: str, stage: str, message: str, progress: int):
-        try:
-            blob_client = self.blob_service_client.get_blob_client(self.container_name, f"{job_id}.json")
-            data = {
-                "stage": stage,
-                "message": message,
-                "progress": progress,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            blob_client.upload_blob(json.dumps(data, ensure_ascii=False), overwrite=True, logging_enable=False)
-            logging.info(f"進捗更新: {stage} ({progress}%)")
-        except Exception as e:
-            logging.error(f"進捗更新失敗: {e}")
+        """進捗を更新（書き込みはバックグラウンドで行い、すぐに戻る）"""
+        data = {
+            "stage": stage,
+            "message": message,
+            "progress": progress,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            self._pending[job_id] = data
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+                self._worker.start()
+    
+    def flush(self):
+        """未書き込みの進捗をすべて書き込む（完了時など、確実に反映させたい場合に呼び出す）"""
+        with self._upload_lock:
+            self._upload_pending()
+    
+    def _run(self):
+        # 未書き込みの進捗がなくなるまで、一定間隔で最新の進捗のみ書き込む
+        while True:
+            with self._upload_lock:
+                with self._lock:
+                    if not self._pending:
+                        self._worker = None
+                        return
+                self._upload_pending()
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+    
+    def _upload_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for job_id, data in pending.items():
+            try:
+                blob_client = self.blob_service_client.get_blob_client(self.container_name, f"{job_id}.json")
+                blob_client.upload_blob(json.dumps(data, ensure_ascii=False), overwrite=True, logging_enable=False)
+                logging.info("進捗更新: %s (%s%%)", data["stage"], data["progress"])
+            except Exception as e:
+                logging.error("進捗更新失敗: %s", e)
     
     def get_progress(self, job_id: str):
         blob_client = self.blob_service_client.get_blob_client(self.container_name, f"{job_id}.json")
@@ -53,21 +117,22 @@ class ProgressManager:
         """結果ファイルのダウンロードURLを生成（1日間有効）"""
         from azure.storage.blob import generate_blob_sas, BlobSasPermissions
         try:
-            container_client = self.blob_service_client.get_container_client("results")
+            results_client = get_blob_service_client("data")
+            container_client = results_client.get_container_client("results")
             blobs = list(container_client.list_blobs(name_starts_with=f"{job_id}/"))
             if not blobs:
                 return None
             
             blob_name = blobs[0].name
             sas_token = generate_blob_sas(
-                account_name=self.blob_service_client.account_name,
+                account_name=results_client.account_name,
                 container_name="results",
                 blob_name=blob_name,
-                account_key=self.blob_service_client.credential.account_key,
+                account_key=results_client.credential.account_key,
                 permission=BlobSasPermissions(read=True),
                 expiry=datetime.utcnow() + timedelta(days=expiry_days)
             )
-            return f"{self.blob_service_client.url}/results/{blob_name}?{sas_token}"
+            return f"{results_client.url}/results/{blob_name}?{sas_token}"
         except:
             return None
     
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Protocol
+
+# LLM応答キャッシュ設定
+# 開発時の再実行や、後続処理の失敗による再実行でLLM呼び出しを繰り返さないために使用する。
+# 本番環境での意図しない再利用を避けるため、LLM_CACHE_ENABLEDを指定した場合のみ有効。
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "").lower() in ("1", "true", "yes")
+CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND") or "file"  # file: ローカルディスク, blob: Azure Blob Storage
+CACHE_DIR = os.getenv("LLM_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "llm_cache")
+CACHE_CONTAINER = "llm-cache"  # blobバックエンドのコンテナ名
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # 有効期限（7日）
+
+class CacheBackend(Protocol):
+    """キャッシュの保存先が実装するインターフェース"""
+    def load(self, key: str) -> dict | None: ...
+    def save(self, key: str, entry: dict): ...
+
+class FileCacheBackend:
+    """ローカルディスクにキャッシュを保存するバックエンド（開発環境向け）"""
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def load(self, key: str) -> dict | None:
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            if time.time() - os.path.getmtime(path) > CACHE_TTL_SECONDS:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, entry: dict):
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書き込んでから置き換える
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.cache_dir, f"{key}.json"))
+
+class BlobCacheBackend:
+    """Azure Blob Storageにキャッシュを保存するバックエンド（複数インスタンスで共有する場合向け）"""
+    def __init__(self, container_name: str):
+        from azure.core.exceptions import ResourceExistsError
+        from core.progress_manager import get_blob_service_client
+
+        # 生成結果と同じ用途（USER_BLOB_CONNECTION_STRING）の共有クライアントを使用し、接続プールを増やさない
+        self.container_client = get_blob_service_client("data").get_container_client(container_name)
+        try:
+            self.container_client.create_container()
+        except ResourceExistsError:
+            pass
+
+    def load(self, key: str) -> dict | None:
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            downloader = self.container_client.get_blob_client(f"{key}.json").download_blob()
+        except ResourceNotFoundError:
+            return None
+        age = datetime.now(timezone.utc) - downloader.properties.last_modified
+        if age.total_seconds() > CACHE_TTL_SECONDS:
+            return None
+        return json.loads(downloader.readall())
+
+    def save(self, key: str, entry: dict):
+        self.container_client.upload_blob(f"{key}.json", json.dumps(entry, ensure_ascii=False), overwrite=True)
+
+@lru_cache(maxsize=1)
+def get_backend() -> CacheBackend:
+    """設定に応じたキャッシュバックエンドを取得（初回のみ生成）
+
+    Returns:
+        CacheBackend: キャッシュバックエンド
+    """
+    if CACHE_BACKEND == "blob":
+        return BlobCacheBackend(CACHE_CONTAINER)
+    return FileCacheBackend(CACHE_DIR)
+
+def make_key(model: str, system_prompt: str, user_prompt: str, shared_context: str = None) -> str:
+    """キャッシュキー（入力内容のSHA-256）を生成
+
+    Args:
+        model: モデル名
+        system_prompt: システムプロンプト
+        user_prompt: ユーザープロンプト
+        shared_context: 共通資料（省略可）
+
+    Returns:
+        str: 16進数のハッシュ値
+    """
+    hasher = hashlib.sha256()
+    for part in ("anthropic", model, shared_context or "", system_prompt, user_prompt):
+        hasher.update(part.encode("utf-8"))
+        hasher.update(b"\x00")  # 区切り（連結位置の違いによる衝突を防ぐ）
+    return hasher.hexdigest()
+
+def normalize_sheet_text(raw_text: str) -> str:
+    """シート内容を比較用に正規化（各行の前後・連続する空白と空行の違いを無視する）
+
+    Args:
+        raw_text: テキスト化したシート内容
+
+    Returns:
+        str: 正規化したシート内容
+    """
+    return "\n".join(" ".join(line.split()) for line in raw_text.splitlines() if line.strip())
+
+def make_sheet_key(model: str, sheet_name: str, raw_text: str) -> str:
+    """シート内容のキャッシュキーを生成
+
+    プロンプト全体ではなく、正規化したシート内容から生成する。
+    各行の前後・連続する空白の違いや、プロンプト見出しに含まれるファイル名の違いではキーが変わらない。
+    （構造化は内容を忠実に転記する処理のため、内容が異なるシートの応答を流用することはしない）
+
+    Args:
+        model: モデル名
+        sheet_name: Excelのシート名（ファイル名を含まない）
+        raw_text: テキスト化したシート内容
+
+    Returns:
+        str: 16進数のハッシュ値
+    """
+    return make_key(model, "sheet", sheet_name, normalize_sheet_text(raw_text))
+
+def load(key: str) -> dict | None:
+    """キャッシュされた応答を取得
+
+    Args:
+        key: make_keyで生成したキー
+
+    Returns:
+        dict | None: {"result": 応答テキスト, "usage": 初回呼び出し時の使用量情報}
+            キャッシュがない・期限切れ・取得失敗の場合はNone
+    """
+    try:
+        return get_backend().load(key)
+    except Exception as e:
+        # キャッシュ取得失敗はキャッシュミスとして扱う（ログのみ）
+        logging.warning("LLM応答キャッシュの取得失敗: %s", e)
+        return None
+
+def save(key: str, result: str, usage: dict = None):
+    """応答をキャッシュに保存
+
+    Args:
+        key: make_keyで生成したキー
+        result: 応答テキスト
+        usage: 使用量情報（バッチ呼び出しなどシート単位で分けられない場合は省略）
+    """
+    try:
+        get_backend().save(key, {"result": result, "usage": usage})
+    except Exception as e:
+        # キャッシュ保存失敗は処理を中断しない（ログのみ）
+        logging.warning("LLM応答キャッシュの保存失敗: %s", e)
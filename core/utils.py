@@ -1,16 +1,130 @@
+import hashlib
+import importlib.util
 import logging
 import io
-import pandas as pd
-from openpyxl import load_workbook
+import pickle
 import re
+from concurrent.futures import as_completed
+from functools import lru_cache
 from pathlib import Path
 
 from core import llm_service
+from core import response_cache
+
+# Markdownアンカーに使用できない文字（英小文字・数字・ハイフン以外）
+ANCHOR_INVALID_CHARS = re.compile(r'[^a-z0-9-]')
+
+# 構造化設計書に埋め込む、元の設計書の内容のダイジェスト（差分モードで新旧の設計書が同一か判定するために使用）
+# LLMによる構造化の結果は実行ごとに揺れるため、構造化前のシート内容から求める
+SOURCE_DIGEST_PATTERN = re.compile(r'^<!-- source-digest: ([0-9a-f]{64}) -->$', re.MULTILINE)
+
+# 設計書Excelの解析エンジン
+# python-calamine（Rust実装）がインストールされていれば使用し、openpyxlより高速に解析する
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+def collapse_blank_lines(lines):
+    """連続する空行を1行にまとめる（先頭・末尾の空行は除く）
+    
+    表の余白の空行は送らずにトークン数を抑えつつ、表や項目の区切りとしての空行は残す。
+    
+    Args:
+        lines: 行のイテラブル（値のない行は空文字列）
+    
+    Yields:
+        str: 空行をまとめた行
+    """
+    pending_blank = False
+    started = False
+    for line in lines:
+        if not line:
+            pending_blank = started
+            continue
+        if pending_blank:
+            yield ''
+            pending_blank = False
+        started = True
+        yield line
+
+def split_sheet_text(raw_text: str, max_chars: int) -> list[str]:
+    """上限を超えるシート内容を行単位で分割する
+    
+    空行（区切り）の位置で分割できる場合はそこで分割し、1行が上限を超える場合は上限の文字数で切る。
+    
+    Args:
+        raw_text: テキスト化したシート内容
+        max_chars: 1つあたりの文字数上限（0以下の場合は分割しない）
+    
+    Returns:
+        list[str]: 分割したシート内容
+    """
+    if max_chars <= 0 or len(raw_text) <= max_chars:
+        return [raw_text]
+    
+    parts = []
+    current = []
+    current_chars = 0
+    last_blank = None  # currentの中で最後の空行の位置（区切りとして優先的に分割する）
+    for line in raw_text.split('\n'):
+        # 1行が上限を超える場合は上限の文字数で切る
+        while len(line) > max_chars:
+            if current:
+                parts.append('\n'.join(current))
+                current, current_chars, last_blank = [], 0, None
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        
+        if current and current_chars + len(line) + 1 > max_chars:
+            if last_blank:
+                # 最後の区切りまでを1つにまとめ、残りは次に回す
+                parts.append('\n'.join(current[:last_blank]))
+                current = current[last_blank + 1:]
+            else:
+                parts.append('\n'.join(current))
+                current = []
+            current_chars = sum(len(l) + 1 for l in current)
+            last_blank = None
+            # 次に回した行と合わせても上限を超える場合は、次に回した行だけで1つにする
+            if current and current_chars + len(line) + 1 > max_chars:
+                parts.append('\n'.join(current))
+                current, current_chars = [], 0
+        
+        if not line and current:
+            last_blank = len(current)
+        current.append(line)
+        current_chars += len(line) + 1
+    
+    if current:
+        parts.append('\n'.join(current))
+    return [part.strip('\n') for part in parts if part.strip()]
+
+def structure_sheet_parts(prompts: list[str]) -> tuple[list[str], dict]:
+    """分割したシートを順に構造化し、1シート分の結果にまとめる
+    
+    Args:
+        prompts: 分割したシートごとの構造化プロンプトのリスト
+    
+    Returns:
+        tuple[list[str], dict]: ([結合した構造化Markdown], 合計使用量情報)
+            llm_service.structuring_batchと同じ形式（1シート分）
+    """
+    contents = []
+    total_usage = {}
+    for prompt in prompts:
+        content, usage = llm_service.structuring(prompt)
+        contents.append(content)
+        add_usage(total_usage, usage)
+        total_usage["model"] = usage["model"]
+    return ["\n\n".join(contents)], total_usage
 
 def process_excel_to_markdown(files, progress_callback=None, job_id=None) -> tuple[str, dict]:
     """
     Excelファイル群を構造化されたMarkdownに変換する
     
+    小さいシートはまとめて1回のLLM呼び出しで構造化し、各呼び出しはllm_service.get_executor()のスレッドプールで並列実行する。
+    バッチはシートの解析中に順次送信し、Excelの解析とLLM呼び出しを並行させる。
+    上限（STRUCTURING_SHEET_MAX_CHARS）を超えるシートは分割して構造化する。
+    出力には、シート名とシート内容から求めたダイジェストをコメントとして埋め込む（extract_source_digestで取得）。
+    
     Args:
         files: アップロードされたExcelファイルのリスト
         progress_callback: 進捗更新用のコールバック関数
@@ -19,76 +133,238 @@ def process_excel_to_markdown(files, progress_callback=None, job_id=None) -> tup
     Returns:
         tuple[str, dict]: (構造化されたMarkdown, 累積使用量情報)
     """
-    all_md_sheets = []  # 各シートの構造化結果を格納
+    # pandasはインポートに時間がかかるため、使用時にインポートする（HTTP関数のコールドスタート短縮）
+    import pandas as pd
+    
     all_toc_list = []   # 目次用のリンクリスト
-    total_usage = {"input_tokens": 0, "output_tokens": 0, "model": ""}
+    sheets = []         # (シート名, 構造化プロンプト, シート内容のキャッシュキー) のリスト
+    structured_results = {}  # シートのインデックス -> 構造化結果
+    total_usage = {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0,
+        "model": ""
+    }
+    
+    # LLMで構造化（小さいシートはバッチにまとめ、バッチ単位で並列実行）
+    # バッチは上限に達した時点で送信し、残りのシートの解析とLLM呼び出しを並行させる
+    futures = {}
+    batch = []  # 送信待ちのシートのインデックス
+    batch_chars = 0
+    config = llm_service.get_config()
+    max_chars = config["structuring_batch_max_chars"]
+    sheet_max_chars = config["structuring_sheet_max_chars"]
+    executor = llm_service.get_executor()
+    split_sheets = 0
+    cache_hits = 0
+    empty_sheets = 0
+    first_sheet_by_content = {}  # (シート名, シート内容) -> 最初に出現したシートのインデックス
+    duplicate_sheets = {}  # 最初に出現したシートのインデックス -> 同一内容のシートのインデックスのリスト
+    source_hasher = hashlib.sha256()  # 全シートのシート名・内容のダイジェスト（ファイル名・空白の違いは含めない）
     
-    # 総シート数をカウント
-    total_sheets = 0
     for file in files:
+        # Excelファイルを読み込む（ファイルごとに1回だけ開き、シートは順に解析する）
+        # （ストリームをそのまま渡し、ファイル全体をbytesに複製しない）
         file.stream.seek(0)
-        file_bytes = file.read()
-        excel_data = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None, header=None)
-        total_sheets += len(excel_data)
+        file_stem = Path(file.filename).stem  # シート名の接頭辞（ファイル内の全シートで共通）
+        with pd.ExcelFile(file.stream, engine=EXCEL_ENGINE) as excel_file:
+            # 各シートのプロンプトを組み立て（全シートのDataFrameを同時に保持しない）
+            for sheet_name in excel_file.sheet_names:
+                df = excel_file.parse(sheet_name, header=None)
+                # シート名をファイル名と組み合わせて一意にする
+                full_sheet_name = f"{file_stem}_{sheet_name}"
+                # Markdownアンカー用のIDを生成
+                anchor = ANCHOR_INVALID_CHARS.sub('', full_sheet_name.strip().lower().replace(' ', '-'))
+                all_toc_list.append(f'- [{full_sheet_name}](#{anchor})')
+                
+                # シートの内容をテキスト化
+                # nanを空文字列に置換し、空白セルを除外
+                # （行ごとにSeriesを生成するDataFrame.applyを避け、NumPy配列を直接走査する）
+                values = df.fillna('').replace('nan', '').to_numpy(dtype=object)
+                # 値のない行が続く場合は1行の空行にまとめ、表や項目の区切りを残しつつプロンプトのトークン数を抑える
+                raw_text = '\n'.join(collapse_blank_lines(' | '.join([t for t in map(str, row) if t.strip()]) for row in values))
+                structuring_prompt = f'--- Excelシート「{full_sheet_name}」 ---\n{raw_text}'
+                for part in (str(sheet_name), response_cache.normalize_sheet_text(raw_text)):
+                    source_hasher.update(part.encode('utf-8'))
+                    source_hasher.update(b'\x00')  # 区切り（連結位置の違いによる衝突を防ぐ）
+                
+                # 値のないシート（空のシートや書式のみのシート）はLLMを呼び出さない
+                if not raw_text.strip():
+                    structured_results[len(sheets)] = f"## {full_sheet_name}\n\n（内容のないシートです）"
+                    sheets.append((full_sheet_name, structuring_prompt, None))
+                    empty_sheets += 1
+                    continue
+                
+                sheet_key = response_cache.make_sheet_key(config["model_structuring"], str(sheet_name), raw_text) if response_cache.CACHE_ENABLED else None
+                idx = len(sheets)
+                sheets.append((full_sheet_name, structuring_prompt, sheet_key))
+                
+                # シート内容のキャッシュ（LLM_CACHE_ENABLED指定時のみ）にヒットしたシートはLLM呼び出しを省略する
+                # 空白の違いやファイル名の違い（設計書の版違いなど）だけのシートも同一内容として再利用される
+                cached = response_cache.load(sheet_key) if sheet_key else None
+                if cached is not None:
+                    structured_results[idx] = f"## {full_sheet_name}\n\n{cached['result']}"
+                    cache_hits += 1
+                    continue
+                
+                # 同じジョブ内に同一のシート（複数ファイルに複製されたテンプレートシートなど）がある場合は、
+                # 最初のシートのみ構造化し、その結果を流用する（シート内容のキャッシュと同じく、シート名も一致する場合のみ）
+                content_key = (str(sheet_name), raw_text)
+                if content_key in first_sheet_by_content:
+                    duplicate_sheets.setdefault(first_sheet_by_content[content_key], []).append(idx)
+                    continue
+                first_sheet_by_content[content_key] = idx
+                
+                # 上限を超えるシートは分割し、単独で構造化する（1回の呼び出しの入出力がmax_tokensを超えないようにする）
+                if sheet_max_chars > 0 and len(raw_text) > sheet_max_chars:
+                    parts = split_sheet_text(raw_text, sheet_max_chars)
+                    part_prompts = [
+                        f'--- Excelシート「{full_sheet_name}」（{part_no}/{len(parts)}） ---\n{part}'
+                        for part_no, part in enumerate(parts, start=1)
+                    ]
+                    futures[executor.submit(structure_sheet_parts, part_prompts)] = [idx]
+                    split_sheets += 1
+                    continue
+                
+                # 合計文字数が上限を超える場合は、それまでのバッチを先に送信する
+                # （バッチの上限を超える単独のシートはそれだけで1バッチ、上限が0以下の場合はバッチ化しない）
+                if batch and (max_chars <= 0 or batch_chars + len(structuring_prompt) > max_chars):
+                    futures[executor.submit(llm_service.structuring_batch, [sheets[i][1] for i in batch])] = batch
+                    batch = []
+                    batch_chars = 0
+                batch.append(idx)
+                batch_chars += len(structuring_prompt)
+    
+    if batch:
+        futures[executor.submit(llm_service.structuring_batch, [sheets[i][1] for i in batch])] = batch
     
-    logging.info(f"総シート数: {total_sheets}")
+    total_sheets = len(sheets)
+    logging.info("総シート数: %d", total_sheets)
+    if cache_hits:
+        logging.info("シート内容キャッシュにヒット: %d/%dシート", cache_hits, total_sheets)
+    if empty_sheets:
+        logging.info("内容のないシートの構造化を省略: %d/%dシート", empty_sheets, total_sheets)
+    if duplicate_sheets:
+        logging.info("同一内容のシートの構造化を省略: %d/%dシート", sum(map(len, duplicate_sheets.values())), total_sheets)
+    if split_sheets:
+        logging.info("上限を超えるシートを分割して構造化: %d/%dシート", split_sheets, total_sheets)
     
     # 進捗計算: 10%から40%までを総シート数で均等に分割
     progress_range = 30  # 10%から40%までの範囲
     progress_per_sheet = progress_range / total_sheets if total_sheets > 0 else 0
-    current_sheet = 0
+    completed = cache_hits + empty_sheets
     
-    for file in files:
-        # Excelファイルを読み込む
-        file.stream.seek(0)
-        file_bytes = file.read()
-        filename = file.filename
-        excel_data = pd.read_excel(io.BytesIO(file_bytes), sheet_name=None, header=None)
+    for future in as_completed(futures):
+        batch = futures[future]
+        batch_names = "」「".join(sheets[idx][0] for idx in batch)
+        completed += len(batch) + sum(len(duplicate_sheets.get(idx, ())) for idx in batch)
+        try:
+            structured_contents, usage = future.result()
+            add_usage(total_usage, usage)
+            total_usage["model"] = usage["model"]
+            logging.info("「%s」の構造化完了 (%d/%d) - 入力: %dtok, 出力: %dtok", batch_names, completed, total_sheets, usage["input_tokens"], usage["output_tokens"])
+            for idx, structured_content in zip(batch, structured_contents):
+                if sheets[idx][2]:
+                    response_cache.save(sheets[idx][2], structured_content)
+        except Exception as e:
+            logging.error("AIによるシート「%s」の構造化中にエラー: %s", batch_names, e)
+            structured_contents = ["（AIによる構造化に失敗しました）"] * len(batch)
+        for idx, structured_content in zip(batch, structured_contents):
+            structured_results[idx] = f"## {sheets[idx][0]}\n\n{structured_content}"
+            for duplicate_idx in duplicate_sheets.get(idx, ()):
+                structured_results[duplicate_idx] = f"## {sheets[duplicate_idx][0]}\n\n{structured_content}"
         
-        # 各シートを処理
-        for sheet_name, df in excel_data.items():
-            # シート名をファイル名と組み合わせて一意にする
-            full_sheet_name = f"{Path(filename).stem}_{sheet_name}"
-            # Markdownアンカー用のIDを生成
-            anchor = re.sub(r'[^a-z0-9-]', '', full_sheet_name.strip().lower().replace(' ', '-'))
-            all_toc_list.append(f'- [{full_sheet_name}](#{anchor})')
-            
-            # シートの内容をテキスト化
-            sheet_content = f"## {full_sheet_name}\n\n"
-            # nanを空文字列に置換し、空白セルを除外
-            df_clean = df.fillna('').replace('nan', '')
-            raw_text = '\n'.join(df_clean.apply(lambda row: ' | '.join([str(v) for v in row if str(v).strip()]), axis=1))
-            structuring_prompt = f'--- Excelシート「{full_sheet_name}」 ---\n{raw_text}'
-            
-            # LLMで構造化
-            try:
-                current_sheet += 1
-                logging.info(f"「{full_sheet_name}」を構造化... ({current_sheet}/{total_sheets})")
-                
-                # 進捗更新: 10%から40%までを総シート数で均等に分割
-                progress_percent = int(10 + (current_sheet * progress_per_sheet))
-                if progress_callback and job_id:
-                    progress_callback("structuring", f"設計書を構造化中... ({current_sheet}/{total_sheets}シート)", progress_percent)
-                
-                structured_content, usage = llm_service.structuring(structuring_prompt)
-                total_usage["input_tokens"] += usage["input_tokens"]
-                total_usage["output_tokens"] += usage["output_tokens"]
-                total_usage["model"] = usage["model"]
-                logging.info(f"シート {current_sheet}/{total_sheets} - 入力: {usage['input_tokens']:,}tok, 出力: {usage['output_tokens']:,}tok")
-                sheet_content += structured_content
-            except Exception as e:
-                logging.error(f"AIによるシート「{full_sheet_name}」の構造化中にエラー: {e}")
-                sheet_content += "（AIによる構造化に失敗しました）"
-                
-            all_md_sheets.append(sheet_content)
+        # 進捗更新: 10%から40%までを総シート数で均等に分割
+        progress_percent = int(10 + (completed * progress_per_sheet))
+        if progress_callback and job_id:
+            progress_callback("structuring", f"設計書を構造化中... ({completed}/{total_sheets}シート)", progress_percent)
     
-    # 最終的なMarkdownドキュメントを組み立て
-    md_output = "# 詳細設計書\n\n## 目次\n\n"
+    # 最終的なMarkdownドキュメントを組み立て（シート順は元の順序を維持）
+    md_output = f"# 詳細設計書\n\n<!-- source-digest: {source_hasher.hexdigest()} -->\n\n## 目次\n\n"
     md_output += "\n".join(all_toc_list)
     md_output += "\n\n---\n\n"
-    md_output += "\n\n---\n\n".join(all_md_sheets)
+    md_output += "\n\n---\n\n".join(structured_results[idx] for idx in range(total_sheets))
     return md_output, total_usage
 
+def extract_source_digest(structured_md: str) -> str | None:
+    """構造化設計書に埋め込まれた、元の設計書の内容のダイジェストを取得
+    
+    Args:
+        structured_md: process_excel_to_markdownで生成した構造化設計書
+    
+    Returns:
+        str | None: ダイジェスト（埋め込まれていない場合はNone）
+    """
+    match = SOURCE_DIGEST_PATTERN.search(structured_md)
+    return match.group(1) if match else None
+
+def log_usage(step_label: str, usage: dict, cost_label: str, cost: float):
+    """
+    ステップごとのトークン使用量とコストをログ出力する
+    
+    桁区切りなどの整形はINFOレベルが有効な場合のみ行う（本番でWARNING以上に設定している場合の無駄な整形を省く）
+    
+    Args:
+        step_label: 使用量ログの見出し（例: "差分検知完了"）
+        usage: 使用量情報
+        cost_label: コストログの見出し（例: "差分検知コスト"）
+        cost: コスト（USD）
+    """
+    if not logging.getLogger().isEnabledFor(logging.INFO):
+        return
+    # 桁区切りは%形式で指定できないため、ここで整形した値を引数として渡す
+    logging.info("%s - 入力: %stok, 出力: %stok, モデル: %s",
+                 step_label, format(usage["input_tokens"], ","), format(usage["output_tokens"], ","), usage["model"])
+    logging.info("%s: $%.4f", cost_label, cost)
+
+def add_usage(usage: dict, extra: dict):
+    """使用量情報に別の呼び出しの使用量を加算する
+    
+    Args:
+        usage: 加算先の使用量情報（直接更新する）
+        extra: 加算する使用量情報
+    """
+    for key in ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"):
+        usage[key] = usage.get(key, 0) + extra.get(key, 0)
+
+# トークン統計のキー -> 使用量情報のキー
+TOKEN_STATS_KEYS = {
+    "total_input_tokens": "input_tokens",
+    "total_output_tokens": "output_tokens",
+    "total_cache_creation_tokens": "cache_creation_input_tokens",
+    "total_cache_read_tokens": "cache_read_input_tokens"
+}
+
+def summarize_token_stats(*usages: dict) -> dict:
+    """各ステップの使用量情報をジョブ全体のトークン統計に集計する
+    
+    設計書はプロンプトキャッシュの対象として送信するため、入力の大半はキャッシュ書き込み・読み込みとして計上される。
+    履歴とコストの計算が一致するよう、キャッシュ分も別の項目として集計する。
+    
+    Args:
+        *usages: 使用量情報（キャッシュ関連のキーは省略可）
+    
+    Returns:
+        dict: トークン統計（total_input_tokens, total_output_tokens, total_cache_creation_tokens, total_cache_read_tokens）
+    """
+    return {stats_key: sum(usage.get(usage_key, 0) for usage in usages) for stats_key, usage_key in TOKEN_STATS_KEYS.items()}
+
+@lru_cache(maxsize=1)
+def load_template_snapshot() -> bytes:
+    """テスト仕様書テンプレートを解析し、複製用のスナップショットを取得（初回のみ解析）
+
+    テンプレートは結合セルが多く、load_workbookによる解析に数秒かかるため、
+    解析済みのWorkbookをpickle化して保持し、呼び出しごとにpickle.loadsで複製する。
+
+    Returns:
+        bytes: pickle化したWorkbook
+    """
+    from openpyxl import load_workbook
+    
+    template_path = "単体テスト仕様書.xlsx"
+    return pickle.dumps(load_workbook(template_path))
+
 def convert_md_to_excel_and_csv(md_output: str, is_diff_mode: bool = False):
     """
     生成されたテスト仕様書（Markdown）をExcelとCSVに変換する
@@ -100,8 +376,10 @@ def convert_md_to_excel_and_csv(md_output: str, is_diff_mode: bool = False):
     Returns:
         tuple: (excel_bytes, csv_bytes) ExcelとCSVのバイナリデータ
     """
-    # Markdown表の行を抽出（|で始まる行のみ）
-    md_lines = [line.strip() for line in md_output.splitlines() if line.strip().startswith("|")]
+    import pandas as pd
+    
+    # Markdown表の行を抽出（|で始まる行のみ、各行のstripは1回だけ行う）
+    md_lines = [line for line in map(str.strip, md_output.splitlines()) if line.startswith("|")]
     
     if not md_lines:
         raise ValueError("テスト仕様書にMarkdown表が見つかりませんでした")
@@ -124,27 +402,27 @@ def convert_md_to_excel_and_csv(md_output: str, is_diff_mode: bool = False):
     # pandas DataFrameに変換
     df = pd.DataFrame(data, columns=header)
 
-    # Excel用のDataFrame（差分モードの場合は変更種別列を除外）
-    df_for_excel = df.copy()
+    # Excel用のDataFrame（差分モードの場合は変更種別列を除外、読み取りのみのため複製しない）
+    df_for_excel = df
     if is_diff_mode and "変更種別" in df.columns:
         df_for_excel = df.drop(columns=["変更種別"])
 
     # --- Excel変換 ---
-    # テンプレートファイルを読み込む
-    template_path = "単体テスト仕様書.xlsx"
-    wb = load_workbook(template_path)
+    # 解析済みテンプレートの複製を取得
+    wb = pickle.loads(load_template_snapshot())
     ws = wb.active
     # 各列のExcel上の位置を定義
     column_map = {
         "No": 1, "大区分": 2, "中区分": 6, "テストケース": 10, "期待結果": 23, "参照元": 42
     }
     start_row = 11  # データの開始行
+    # 書き込む列（DataFrame上の位置, Excel上の位置）を事前に決定
+    columns = [(df_for_excel.columns.get_loc(col_name), excel_col)
+               for col_name, excel_col in column_map.items() if col_name in df_for_excel.columns]
     # 各データをExcelに書き込む
-    for i, row in enumerate(df_for_excel.itertuples(index=False), start=start_row):
-        for col_name, excel_col in column_map.items():
-            if col_name in df_for_excel.columns:
-                value = getattr(row, col_name)
-                ws.cell(row=i, column=excel_col, value=value)
+    for i, row in enumerate(df_for_excel.to_numpy(), start=start_row):
+        for col_index, excel_col in columns:
+            ws.cell(row=i, column=excel_col, value=row[col_index])
     
     # Excelをバイナリデータとして保存
     excel_buffer = io.BytesIO()
@@ -152,11 +430,9 @@ def convert_md_to_excel_and_csv(md_output: str, is_diff_mode: bool = False):
     excel_bytes = excel_buffer.getvalue()
     
     # --- CSV変換 ---
-    df_csv = df.copy()
-    # <br>タグを改行に変換
-    for col in df_csv.columns:
-        if df_csv[col].dtype == 'object':
-            df_csv[col] = df_csv[col].str.replace('<br>', '\n', regex=False)
+    # <br>タグを改行に変換（全列を1回で置換）
+    # CSV化した後の文字列で置換すると、改行を含むセルが引用符で囲まれなくなるため、CSV化の前に行う
+    df_csv = df.replace('<br>', '\n', regex=True)
     
     # CSVをバイナリデータとして保存（BOM付きUTF-8）
     csv_buffer = io.StringIO()
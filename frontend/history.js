@@ -58,7 +58,13 @@ function renderPage() {
     tbody.innerHTML = allResults.map((item, index) => {
         const startTime = item.start_time ? formatDate(item.start_time) : '-';
         const endTime = item.end_time ? formatDate(item.end_time) : '-';
-        const inputTokens = item.token_stats?.total_input_tokens ? item.token_stats.total_input_tokens.toLocaleString() : '-';
+        // 入力トークンはプロンプトキャッシュの書き込み・読み込み分を含めて表示する（内訳はツールチップ）
+        const stats = item.token_stats || {};
+        const cacheCreation = stats.total_cache_creation_tokens || 0;
+        const cacheRead = stats.total_cache_read_tokens || 0;
+        const totalInput = (stats.total_input_tokens || 0) + cacheCreation + cacheRead;
+        const inputTokens = totalInput ? totalInput.toLocaleString() : '-';
+        const inputTitle = `キャッシュ外: ${(stats.total_input_tokens || 0).toLocaleString()} / キャッシュ書き込み: ${cacheCreation.toLocaleString()} / キャッシュ読み込み: ${cacheRead.toLocaleString()}`;
         const outputTokens = item.token_stats?.total_output_tokens ? item.token_stats.total_output_tokens.toLocaleString() : '-';
         
         return `
@@ -68,7 +74,7 @@ function renderPage() {
             <td>${endTime}</td>
             <td>${item.filename}</td>
             <td>${formatSize(item.size)}</td>
-            <td>${inputTokens}</td>
+            <td title="${inputTitle}">${inputTokens}</td>
             <td>${outputTokens}</td>
             <td>
                 <button class="btn-download" onclick="download('${item.instanceId}')">ダウンロード</button>
@@ -85,26 +91,26 @@ function renderPage() {
  * 
  * @param {string} instanceId - ジョブID
  * 
- * /api/download/{instanceId} を呼び出し、ZIPファイルをダウンロード
+ * /api/download/{instanceId} でSAS付きURLを取得し、ZIPファイルをダウンロード
+ * （ZIPはリンク遷移でBlob Storageから直接取得する。ファイル名はSASのContent-Dispositionで指定済み）
  */
 async function download(instanceId) {
     try {
         // 履歴データからファイル名を取得
         const item = allResults.find(r => r.instanceId === instanceId);
-        const filename = item ? item.filename : 'テスト仕様書.zip';
         
-        const res = await fetch(`${API_BASE_URL}/download/${instanceId}`);
+        // ファイル名を渡すと、サーバー側で結果の一覧取得を省略できる
+        const query = item ? `?filename=${encodeURIComponent(item.filename)}` : '';
+        const res = await fetch(`${API_BASE_URL}/download/${instanceId}${query}`);
         if (!res.ok) throw new Error('ダウンロードに失敗しました');
         
-        const blob = await res.blob();
-        const url = window.URL.createObjectURL(blob);
+        // fetchでBlob Storageから取得するとCORSの対象になるため、リンクとして開く
+        const { url } = await res.json();
         const a = document.createElement('a');
         a.href = url;
-        a.download = filename;
         document.body.appendChild(a);
         a.click();
         a.remove();
-        window.URL.revokeObjectURL(url);
     } catch (err) {
         alert(`エラー: ${err.message}`);
     }
@@ -55,9 +55,9 @@ modeRadios.forEach(radio => {
  * 
  * 処理フロー:
  * 1. モードと粒度を取得
- * 2. ファイルをFormDataに追加
- * 3. バックエンドに送信
- * 4. instanceIdを取得
+ * 2. アップロード用のSAS付きURLとinstanceIdを取得
+ * 3. ファイルをBlob Storageへ直接アップロード（並列）
+ * 4. バックエンドに処理開始を依頼
  * 5. ポーリング開始
  */
 uploadBtn.addEventListener("click", async () => {
@@ -65,26 +65,25 @@ uploadBtn.addEventListener("click", async () => {
     const mode = document.querySelector('input[name="mode"]:checked').value;
     const granularity = document.querySelector('input[name="granularity"]:checked').value;
     
-    const formData = new FormData();
+    let excelFiles;          // 設計書（差分モードでは新版設計書）
+    let oldStructuredMd;     // 旧版の構造化設計書（差分モードのみ）
+    let oldTestSpecMd;       // 旧版のテスト仕様書（差分モードのみ）
     
     // 通常モード: 設計書のみアップロード
     if (mode === "normal") {
-        const files = document.querySelector("#fileInput").files;
-        if (files.length === 0) {
+        excelFiles = document.querySelector("#fileInput").files;
+        if (excelFiles.length === 0) {
             status.textContent = "詳細設計書を選択してください";
             return;
         }
-        for (let i = 0; i < files.length; i++) {
-            formData.append("documentFiles", files[i]);
-        }
     } 
     // 差分モード: 新版設計書 + 旧版構造化設計書 + 旧版テスト仕様書
     else {
-        const newExcelFiles = document.querySelector("#newExcelFiles").files;
-        const oldStructuredMd = document.querySelector("#oldStructuredMd").files;
-        const oldTestSpecMd = document.querySelector("#oldTestSpecMd").files;
+        excelFiles = document.querySelector("#newExcelFiles").files;
+        oldStructuredMd = document.querySelector("#oldStructuredMd").files;
+        oldTestSpecMd = document.querySelector("#oldTestSpecMd").files;
         
-        if (newExcelFiles.length === 0) {
+        if (excelFiles.length === 0) {
             status.textContent = "新版の設計書を選択してください";
             return;
         }
@@ -96,15 +95,7 @@ uploadBtn.addEventListener("click", async () => {
             status.textContent = "旧版のテスト仕様書を選択してください";
             return;
         }
-        
-        for (let i = 0; i < newExcelFiles.length; i++) {
-            formData.append("newExcelFiles", newExcelFiles[i]);
-        }
-        formData.append("oldStructuredMd", oldStructuredMd[0]);
-        formData.append("oldTestSpecMd", oldTestSpecMd[0]);
     }
-    
-    formData.append("granularity", granularity);
 
     uploadBtn.disabled = true;
     historyLink.style.pointerEvents = "none";
@@ -114,17 +105,37 @@ uploadBtn.addEventListener("click", async () => {
     progressBar.style.width = "0%";
     progressText.textContent = "処理を開始しています...";
 
-    // モードに応じてエンドポイントを切り替え
-    const endpoint = mode === "normal" 
-        ? `${API_BASE_URL}/upload`
-        : `${API_BASE_URL}/upload_diff`;
-
     try {
-        // バックエンドにファイルを送信（Durable Functionsのジョブを開始）
-        // 即座にinstanceIdが返却され、実際の処理はバックグラウンドで実行される
-        const startRes = await fetch(endpoint, {
+        // アップロード先（SAS付きURL）とジョブIDを取得（ジョブは/start-processingで開始される）
+        const sasRes = await fetch(`${API_BASE_URL}/upload-sas`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ mode, files: Array.from(excelFiles, file => file.name) }),
+        });
+        if (!sasRes.ok) {
+            throw new Error(await sasRes.text());
+        }
+        const sasData = await sasRes.json();
+        
+        // ファイルをBlob Storageへ直接アップロード（バックエンドを経由せず、全ファイルを並列で送信）
+        const uploads = Array.from(excelFiles, (file, i) => [sasData.files[i].url, file]);
+        if (mode === "diff") {
+            uploads.push([sasData.old_structured_md.url, oldStructuredMd[0]]);
+            uploads.push([sasData.old_test_spec_md.url, oldTestSpecMd[0]]);
+        }
+        await Promise.all(uploads.map(([url, file]) => uploadToBlob(url, file)));
+        
+        // 処理開始を依頼（ファイルは転送しないため即座にinstanceIdが返却され、実際の処理はバックグラウンドで実行される）
+        const startRes = await fetch(`${API_BASE_URL}/start-processing`, {
             method: "POST",
-            body: formData,
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+                instance_id: sasData.instance_id,
+                upload_token: sasData.upload_token,
+                mode,
+                granularity,
+                files: sasData.files.map(({ filename, blob_name }) => ({ filename, blob_name })),
+            }),
         });
         
         if (!startRes.ok) {
@@ -155,6 +166,23 @@ uploadBtn.addEventListener("click", async () => {
     }
 });
 
+/**
+ * SAS付きURLへファイルを直接アップロード
+ * 
+ * @param {string} url - SAS付きのBlob URL
+ * @param {File} file - アップロードするファイル
+ */
+async function uploadToBlob(url, file) {
+    const res = await fetch(url, {
+        method: "PUT",
+        headers: { "x-ms-blob-type": "BlockBlob" },
+        body: file,
+    });
+    if (!res.ok) {
+        throw new Error(`${file.name}のアップロードに失敗しました (${res.status})`);
+    }
+}
+
 // ==================== 進捗ポーリング ====================
 
 /**
@@ -1,14 +1,27 @@
 # ==================== インポート ====================
 import azure.functions as func  # Azure Functions基本ライブラリ
 import azure.durable_functions as df  # Durable Functions（長時間処理・非同期処理用）
+import asyncio  # 非同期処理（アップロードの並列化）
+import hashlib  # アップロードトークンの署名
+import hmac  # アップロードトークンの署名・検証
+import io  # バイナリデータのストリーム化
 import logging  # ログ出力
 import json  # JSON操作
 import os  # 環境変数取得
+import threading  # 進捗書き込みのタイマー・起動時の事前準備
+import time  # 進捗更新の間引き・アップロードトークンの有効期限
+import uuid  # ジョブの採番
+from collections import OrderedDict  # 進捗キャッシュ（LRU）
+from concurrent.futures import ThreadPoolExecutor  # 入力ファイルの並列ダウンロード
+from datetime import datetime, timedelta, timezone  # SASの有効期限
+from functools import lru_cache  # Blobクライアントの共有
+from pathlib import Path  # ファイル名の操作
 from urllib.parse import quote  # URLエンコード（ファイル名用）
-from azure.storage.blob import BlobServiceClient  # Azure Blob Storage操作
-from azure.core.exceptions import ResourceExistsError  # コンテナ重複エラー
+from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas  # Azure Blob Storage操作
+from azure.core import MatchConditions  # 条件付き取得（ETag）
+from azure.core.exceptions import ResourceExistsError, ResourceNotModifiedError  # コンテナ重複エラー・未更新
 
-from core import normal_mode, diff_mode  # ビジネスロジック層
+from core import normal_mode, diff_mode, utils  # ビジネスロジック層
 
 # ==================== 進捗管理の仕組み ====================
 # Durable Functionsでは、Orchestrator内で外部リソース（Blob Storage）への
@@ -16,15 +29,18 @@ from core import normal_mode, diff_mode  # ビジネスロジック層
 # そのため、グローバル変数とコールバック関数を使って進捗更新を実現している。
 
 _progress_callback = None  # 進捗更新用のコールバック関数（Activity内で設定）
+_progress_flush_callback = None  # 未書き込みの進捗を書き込む関数（Activity内で設定）
 
-def set_progress_callback(callback):
+def set_progress_callback(callback, flush_callback=None):
     """Activity関数内で進捗更新用のコールバック関数を設定
     
     Args:
         callback: 進捗更新を行う関数（stage, message, progressを引数に取る）
+        flush_callback: 保留中の進捗を書き込む関数（省略可）
     """
-    global _progress_callback
+    global _progress_callback, _progress_flush_callback
     _progress_callback = callback
+    _progress_flush_callback = flush_callback
 
 class DurableProgressManager:
     """Durable Functions用のProgressManager
@@ -37,6 +53,11 @@ class DurableProgressManager:
         if _progress_callback:
             _progress_callback(stage, message, progress)
     
+    def flush(self):
+        """保留中の進捗を書き込む（コールバック関数経由）"""
+        if _progress_flush_callback:
+            _progress_flush_callback()
+    
     def get_progress(self, job_id):
         """進捗取得（Durable Functionsでは使用しない）"""
         return None
@@ -45,7 +66,62 @@ class DurableProgressManager:
         """進捗削除（Durable Functionsでは使用しない）"""
         pass
 
+PROGRESS_WRITE_INTERVAL_SECONDS = 1.0  # 進捗のBlob書き込み間隔（秒）
+
+class ThrottledProgressWriter:
+    """進捗の書き込みを一定間隔に間引く
+    
+    直前の書き込みから間隔が空いていない更新は保留し、間隔の経過後に最新の1件のみ書き込む（trailing edge）。
+    保留中の更新はタイマーで書き込むため、連続した更新の最後の1件が失われることはない。
+    完了（100%）の更新とflush時は即座に書き込む。
+    """
+    def __init__(self, write, interval: float = PROGRESS_WRITE_INTERVAL_SECONDS):
+        """
+        Args:
+            write: 進捗を書き込む関数（updateに渡した引数で呼び出す。例外は送出しないこと）
+            interval: 書き込み間隔（秒）
+        """
+        self._write = write
+        self._interval = interval
+        self._lock = threading.Lock()  # 書き込み順序を保つため、書き込みはロック内で行う
+        self._last_write = float("-inf")
+        self._pending = None  # 保留中の最新の更新（引数のタプル）
+        self._timer = None
+    
+    def update(self, *args, force: bool = False):
+        """進捗を更新（間隔内の場合は保留し、タイマーで書き込む）
+        
+        Args:
+            *args: writeに渡す引数
+            force: Trueの場合は間隔に関係なく即座に書き込む
+        """
+        with self._lock:
+            wait = self._interval - (time.monotonic() - self._last_write)
+            if force or wait <= 0:
+                self._write_locked(args)
+                return
+            self._pending = args
+            if self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def flush(self):
+        """保留中の更新があれば書き込む"""
+        with self._lock:
+            if self._pending is not None:
+                self._write_locked(self._pending)
+    
+    def _write_locked(self, args):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending = None
+        self._last_write = time.monotonic()
+        self._write(*args)
+
 # coreモジュールのProgressManagerをDurable Functions用に置き換え
+# （normal_mode/diff_modeは呼び出し時にcore.progress_manager.ProgressManagerを参照するため、インポート後の置き換えでも反映される）
 try:
     import core.progress_manager
     core.progress_manager.ProgressManager = DurableProgressManager
@@ -62,13 +138,28 @@ CORS_HEADERS = {
     "Access-Control-Allow-Headers": "Content-Type"  # 許可するヘッダー
 }
 
+# CORS preflight（OPTIONSリクエスト）への応答。内容は常に同じため、全エンドポイントで同じインスタンスを返す
+_PREFLIGHT_RESPONSE = func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+
 # ==================== Blob Storage操作用ヘルパー関数 ====================
 
-def get_blob_service_client():
+# 用途ごとの接続文字列の環境変数
+# 未設定の場合はAZURE_STORAGE_CONNECTION_STRINGのストレージアカウントを使用する
+STORAGE_CONNECTION_ENV = {
+    "data": "USER_BLOB_CONNECTION_STRING",  # temp-uploads, results（アップロードファイル・生成結果）
+    "progress": "PROGRESS_BLOB_CONNECTION_STRING"  # progress（進捗情報）
+}
+
+def get_blob_service_client(purpose: str = "data"):
     """Azure Blob Storage Clientを取得
     
-    環境変数からAzure Storageの接続文字列を取得し、
+    用途に応じた環境変数からAzure Storageの接続文字列を取得し、
     BlobServiceClientを初期化して返す。
+    用途ごとに別のストレージアカウントを指定でき、Durable Functions自体が使用するアカウント
+    （AzureWebJobsStorage）や、進捗の頻繁な書き込みとファイルの読み書きの間で負荷を分散できる。
+    
+    Args:
+        purpose: 用途（"data": temp-uploads/results, "progress": progress）
     
     Returns:
         BlobServiceClient: Blob Storage操作用クライアント
@@ -76,16 +167,63 @@ def get_blob_service_client():
     Raises:
         ValueError: 環境変数が設定されていない場合
     """
-    connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    connection_string = os.environ.get(STORAGE_CONNECTION_ENV[purpose]) or os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
     if not connection_string:
         raise ValueError("AZURE_STORAGE_CONNECTION_STRING が設定されていません")
-    return BlobServiceClient.from_connection_string(connection_string)
+    return create_blob_service_client(connection_string)
+
+@lru_cache(maxsize=None)
+def create_blob_service_client(connection_string: str):
+    """接続文字列に対応するBlobServiceClientを生成
+    
+    接続文字列ごとに初回のみ生成し、同じインスタンスで実行される以降の呼び出しでは
+    同じクライアント（HTTP接続プール）を再利用する。用途が異なっても同じアカウントであれば共有される。
+    
+    Args:
+        connection_string: Azure Storageの接続文字列
+    
+    Returns:
+        BlobServiceClient: Blob Storage操作用クライアント
+    """
+    import requests
+    from azure.core.pipeline.transport import RequestsTransport
+    
+    # 並列アップロード・ダウンロードや同時リクエストで接続が不足しないよう、接続プールを拡張する
+    # （requestsの既定は1ホストあたり10接続で、超えた分の接続はKeep-Aliveされずに破棄される）
+    # リトライはSDKのリトライポリシーに任せるため、HTTPAdapter側では行わない
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=32, pool_maxsize=64)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)  # Azurite（ローカル開発）用
+    
+    # 8MiBを超えるBlobは4MiBのブロックに分割してアップロードする（SDKの既定では64MiBまで単一のPUTで送信される）
+    return BlobServiceClient.from_connection_string(
+        connection_string,
+        transport=RequestsTransport(session=session, connection_timeout=10, read_timeout=60),
+        max_single_put_size=8 * 1024 * 1024,
+        max_block_size=4 * 1024 * 1024
+    )
+
+def get_container_purpose(container_name: str) -> str:
+    """コンテナ名から接続先の用途を判定
+    
+    Args:
+        container_name: コンテナ名
+    
+    Returns:
+        str: 用途（"progress" or "data"）
+    """
+    return "progress" if container_name == "progress" else "data"
+
+_ensured_containers = set()  # 作成（または存在）を確認済みのコンテナ名
 
 def ensure_container_exists(container_name: str):
     """Blobコンテナが存在しない場合は作成
     
     指定されたコンテナが存在しない場合は新規作成する。
-    既に存在する場合はResourceExistsErrorが発生するが、無視して続行する。
+    まず存在確認（HEAD）を行い、存在しない場合のみ作成リクエストを送る。
+    作成が他のリクエストと競合した場合はResourceExistsErrorが発生するが、無視して続行する。
+    確認済みのコンテナはプロセス内で記録し、以降の呼び出しではREST呼び出しを省略する。
     
     Args:
         container_name: 作成するコンテナ名
@@ -93,20 +231,133 @@ def ensure_container_exists(container_name: str):
             - results: 生成されたZIPファイルの保存先
             - progress: 進捗情報の保存先
     """
+    if container_name in _ensured_containers:
+        return
     try:
-        blob_service_client = get_blob_service_client()
-        blob_service_client.create_container(container_name)
-        logging.info(f"コンテナ作成: {container_name}")
+        blob_service_client = get_blob_service_client(get_container_purpose(container_name))
+        container_client = blob_service_client.get_container_client(container_name)
+        if container_client.exists():
+            # 既存コンテナ（通常のケース）は作成リクエストを送らない
+            _ensured_containers.add(container_name)
+            return
+        container_client.create_container()
+        logging.info("コンテナ作成: %s", container_name)
+        _ensured_containers.add(container_name)
     except ResourceExistsError:
         # コンテナが既に存在する場合（正常系）
-        logging.info(f"コンテナ既存: {container_name}")
+        logging.info("コンテナ既存: %s", container_name)
+        _ensured_containers.add(container_name)
     except Exception as e:
         # その他のエラー（権限不足など）
-        logging.error(f"コンテナ作成エラー: {e}")
+        logging.error("コンテナ作成エラー: %s", e)
+
+async def upload_blobs_concurrently(blob_service_client, container_name: str, uploads: list[tuple[str, object]]):
+    """複数のBlobを並列でアップロード
+    
+    同期版SDKのアップロードをスレッドで実行し、イベントループを止めずに全ファイルを同時に送信する。
+    （ファイル数に比例していた待ち時間を、ほぼ1回分の往復時間に短縮する）
+    ブロック分割される大きなファイルは、ファイル内のブロックも並列で送信する。
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント（全アップロードで共有）
+        container_name: アップロード先のコンテナ名
+        uploads: (Blob名, データ) のリスト
+            データにはアップロードされたファイルのストリームを渡す（bytesに読み込まず、SDKがブロック単位で読み出して送信する）
+    """
+    def upload(blob_name, data):
+        blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+        blob_client.upload_blob(data, overwrite=True, max_concurrency=4)
+    
+    await asyncio.gather(*(asyncio.to_thread(upload, blob_name, data) for blob_name, data in uploads))
+
+def input_blob_name(instance_id: str, prefix: str, idx: int, filename: str) -> str:
+    """設計書ファイルの保存先Blob名を生成（全アップロード経路で共通の命名規則）
+    
+    Args:
+        instance_id: ジョブID
+        prefix: ファイル種別（"file": 通常モード, "new_excel": 差分モードの新版設計書）
+        idx: ファイルの通し番号
+        filename: 元のファイル名
+    
+    Returns:
+        str: Blob名（例: {instance_id}/input/file_0_設計書.xlsx）
+    """
+    return f"{instance_id}/input/{prefix}_{idx}_{filename}"
+
+async def save_input_files(instance_id: str, prefix: str, files, extra_uploads: list[tuple[str, object]] = ()) -> list[dict]:
+    """アップロードされたファイルをtemp-uploadsコンテナに並列で保存
+    
+    Args:
+        instance_id: ジョブID
+        prefix: 設計書のファイル種別（input_blob_nameを参照）
+        files: アップロードされた設計書ファイルのリスト
+        extra_uploads: 設計書以外に保存する (Blob名, データ) のリスト（差分モードの旧版ファイルなど）
+    
+    Returns:
+        list[dict]: 設計書のファイル参照情報（filename, blob_name, container）
+    """
+    await asyncio.to_thread(ensure_container_exists, "temp-uploads")
+    file_refs = []
+    uploads = list(extra_uploads)
+    for idx, file in enumerate(files):
+        blob_name = input_blob_name(instance_id, prefix, idx, file.filename)
+        uploads.append((blob_name, file.stream))
+        file_refs.append({
+            "filename": file.filename,
+            "blob_name": blob_name,
+            "container": "temp-uploads"
+        })
+    await upload_blobs_concurrently(get_blob_service_client(), "temp-uploads", uploads)
+    return file_refs
+
+async def start_orchestrator(req: func.HttpRequest, client, instance_id: str, input_data: dict) -> func.HttpResponse:
+    """入力データを渡してOrchestratorを起動し、ステータス確認用のレスポンスを返す
+    
+    Args:
+        req: HTTPリクエスト（ステータス確認用URLの生成に使用）
+        client: Durable Functionsクライアント
+        instance_id: ジョブID
+        input_data: Orchestratorに渡す入力データ
+    
+    Returns:
+        HttpResponse: instance_idとステータス確認用URLを含むレスポンス
+            create_check_status_responseは以下のURLを含むレスポンスを生成:
+            - statusQueryGetUri: 進捗確認用URL
+            - sendEventPostUri: イベント送信用URL
+            - terminatePostUri: 処理中断用URL
+    """
+    await client.start_new("orchestrator", instance_id=instance_id, client_input=input_data)
+    response = client.create_check_status_response(req, instance_id)
+    response.headers.update(CORS_HEADERS)
+    return response
+
+def _bootstrap():
+    """Blobクライアントとコンテナをバックグラウンドで準備（コールドスタート対策）
+    
+    初回リクエストで行っていたクライアント生成・コンテナ確認を、Functionsホストの起動処理と並行して済ませる。
+    ネットワーク通信を伴うため、モジュール読み込み（関数のインデックス作成）を待たせないよう別スレッドで実行する。
+    失敗してもリクエスト時に改めて同じ処理が行われるため、ここでは例外を外に出さない。
+    （coreモジュールはファイル先頭で読み込み済み）
+    
+    なお、1インスタンス内でリクエストが待たされる場合は、アプリ設定のFUNCTIONS_WORKER_PROCESS_COUNTを
+    2以上にしてワーカープロセスを増やすことで緩和できる（各プロセスでこの準備処理が1回ずつ行われる）。
+    """
+    try:
+        for purpose in STORAGE_CONNECTION_ENV:
+            get_blob_service_client(purpose)
+        for container_name in ("temp-uploads", "results", "progress"):
+            ensure_container_exists(container_name)
+    except Exception as e:
+        logging.warning("起動時の事前準備に失敗（リクエスト時に再試行）: %s", e, exc_info=True)
+
+if os.environ.get("AZURE_STORAGE_CONNECTION_STRING"):
+    threading.Thread(target=_bootstrap, name="storage-bootstrap", daemon=True).start()
 
 # ==================== HTTP Starters ====================
 # Starter関数は、HTTPリクエストを受け付けてOrchestrator関数を起動する役割を持つ。
 # HTTP応答230秒制限を回避するため、ファイルをBlobに保存してinstance_idを即座に返却する。
+# instance_idはStarter側で採番し、ファイル保存後に入力データを渡してOrchestratorを起動する
+# （起動とデータ送信を1回の呼び出しで行い、制御キューへのアクセスを減らす）。
 # 実際の処理はOrchestrator → Activity関数で非同期実行される。
 
 @app.route(route="upload", methods=["POST", "OPTIONS"])
@@ -115,11 +366,10 @@ async def upload_starter(req: func.HttpRequest, client) -> func.HttpResponse:
     """通常モード: 設計書をアップロードしてテスト仕様書生成を開始
     
     処理フロー:
-    1. アップロードされたExcelファイルをBlob Storageに保存
-    2. Orchestrator関数を起動してinstance_idを取得
-    3. Blobパスをinstance_idに変更（一意性確保）
-    4. Orchestratorにデータを送信
-    5. instance_idを含むレスポンスを即座に返却（3~5秒）
+    1. instance_idを採番
+    2. アップロードされたExcelファイルをBlob Storageに保存（パスにinstance_idを使用）
+    3. 入力データを渡してOrchestrator関数を起動
+    4. instance_idを含むレスポンスを即座に返却（3~5秒）
     
     Args:
         req: HTTPリクエスト（FormDataでファイルを受信）
@@ -132,7 +382,7 @@ async def upload_starter(req: func.HttpRequest, client) -> func.HttpResponse:
     """
     # CORS preflight対応（OPTIONSリクエスト）
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     try:
         # ========== 1. リクエストデータの取得 ==========
@@ -142,28 +392,14 @@ async def upload_starter(req: func.HttpRequest, client) -> func.HttpResponse:
         
         granularity = req.form.get("granularity", "simple")  # テスト粒度（デフォルト: simple）
         
-        # ========== 2. Orchestratorを起動してinstance_idを取得 ==========
-        # instance_idはDurable Functionsが自動生成する一意のID
-        instance_id = await client.start_new("orchestrator")
+        # ========== 2. instance_idを採番 ==========
+        # Orchestratorの起動前にBlobのパスを決めるため、一意のIDをここで生成する
+        instance_id = str(uuid.uuid4())
         
-        # ========== 3. Blob Storageの準備 ==========
-        ensure_container_exists("temp-uploads")
-        blob_service_client = get_blob_service_client()
-        file_refs = []
+        # ========== 3. ファイルをBlobに保存（instance_idを使用、全ファイルを並列でアップロード） ==========
+        file_refs = await save_input_files(instance_id, "file", files)
         
-        # ========== 4. ファイルをBlobに保存（instance_idを使用） ==========
-        for idx, file in enumerate(files):
-            blob_name = f"{instance_id}/input/file_{idx}_{file.filename}"
-            blob_client = blob_service_client.get_blob_client(container="temp-uploads", blob=blob_name)
-            blob_client.upload_blob(file.stream.read(), overwrite=True)
-            
-            file_refs.append({
-                "filename": file.filename,
-                "blob_name": blob_name,
-                "container": "temp-uploads"
-            })
-        
-        # ========== 5. Orchestratorにデータを送信 ==========
+        # ========== 4. 入力データを渡してOrchestratorを起動 ==========
         input_data = {
             "mode": "normal",  # 処理モード（通常モード）
             "files": file_refs,  # ファイル参照情報
@@ -171,20 +407,11 @@ async def upload_starter(req: func.HttpRequest, client) -> func.HttpResponse:
             "instance_id": instance_id  # ジョブID
         }
         
-        # raise_eventでOrchestratorにデータを送信（イベント名: start_processing）
-        await client.raise_event(instance_id, "start_processing", input_data)
-        
-        # ========== 6. レスポンスを即座に返却（3~5秒） ==========
-        # create_check_status_responseは以下のURLを含むレスポンスを生成:
-        # - statusQueryGetUri: 進捗確認用URL
-        # - sendEventPostUri: イベント送信用URL
-        # - terminatePostUri: 処理中断用URL
-        response = client.create_check_status_response(req, instance_id)
-        response.headers.update(CORS_HEADERS)
-        return response
+        # ========== 5. レスポンスを即座に返却（3~5秒） ==========
+        return await start_orchestrator(req, client, instance_id, input_data)
         
     except Exception as e:
-        logging.error(f"Starter error: {e}")
+        logging.error("Starter error: %s", e)
         return func.HttpResponse(f"エラー: {str(e)}", status_code=500, headers=CORS_HEADERS)
 
 
@@ -194,11 +421,10 @@ async def upload_diff_starter(req: func.HttpRequest, client) -> func.HttpRespons
     """差分モード: 新旧設計書を比較してテスト仕様書の差分版を生成
     
     処理フロー:
-    1. 新版設計書（Excel）と旧版成果物（MD）をBlob Storageに保存
-    2. Orchestrator関数を起動してinstance_idを取得
-    3. Blobパスをinstance_idに変更
-    4. Orchestratorにデータを送信
-    5. instance_idを含むレスポンスを即座に返却
+    1. instance_idを採番
+    2. 新版設計書（Excel）と旧版成果物（MD）をBlob Storageに保存（パスにinstance_idを使用）
+    3. 入力データを渡してOrchestrator関数を起動
+    4. instance_idを含むレスポンスを即座に返却
     
     Args:
         req: HTTPリクエスト（FormDataでファイルを受信）
@@ -213,7 +439,7 @@ async def upload_diff_starter(req: func.HttpRequest, client) -> func.HttpRespons
     """
     # CORS preflight対応
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     try:
         # ========== 1. リクエストデータの取得 ==========
@@ -227,33 +453,16 @@ async def upload_diff_starter(req: func.HttpRequest, client) -> func.HttpRespons
         
         granularity = req.form.get("granularity", "simple")
         
-        # Orchestratorを起動してinstance_idを取得
-        instance_id = await client.start_new("orchestrator")
-        
-        # コンテナ作成
-        ensure_container_exists("temp-uploads")
-        blob_service_client = get_blob_service_client()
-        file_refs = []
-        
-        # ファイルをBlobに保存（instance_idを使用）
-        for idx, file in enumerate(new_excel_files):
-            blob_name = f"{instance_id}/input/new_excel_{idx}_{file.filename}"
-            blob_client = blob_service_client.get_blob_client(container="temp-uploads", blob=blob_name)
-            blob_client.upload_blob(file.stream.read(), overwrite=True)
-            file_refs.append({
-                "filename": file.filename,
-                "blob_name": blob_name,
-                "container": "temp-uploads"
-            })
+        # instance_idを採番（Orchestratorはファイル保存後に起動する）
+        instance_id = str(uuid.uuid4())
         
-        # 旧版ファイルも保存
+        # 新版・旧版のファイルをまとめて並列でBlobに保存（instance_idを使用）
         old_md_blob = f"{instance_id}/input/old_structured.md"
-        blob_client = blob_service_client.get_blob_client(container="temp-uploads", blob=old_md_blob)
-        blob_client.upload_blob(old_structured_md.stream.read(), overwrite=True)
-        
         old_spec_blob = f"{instance_id}/input/old_test_spec.md"
-        blob_client = blob_service_client.get_blob_client(container="temp-uploads", blob=old_spec_blob)
-        blob_client.upload_blob(old_test_spec_md.stream.read(), overwrite=True)
+        file_refs = await save_input_files(instance_id, "new_excel", new_excel_files, [
+            (old_md_blob, old_structured_md.stream),
+            (old_spec_blob, old_test_spec_md.stream)
+        ])
         
         input_data = {
             "mode": "diff",
@@ -264,20 +473,270 @@ async def upload_diff_starter(req: func.HttpRequest, client) -> func.HttpRespons
             "instance_id": instance_id
         }
         
-        await client.raise_event(instance_id, "start_processing", input_data)
+        return await start_orchestrator(req, client, instance_id, input_data)
+        
+    except Exception as e:
+        logging.error("Diff starter error: %s", e)
+        return func.HttpResponse(f"エラー: {str(e)}", status_code=500, headers=CORS_HEADERS)
+
+
+# ==================== 直接アップロード（SAS） ====================
+# ブラウザからBlob Storageへファイルを直接アップロードするためのエンドポイント。
+# Function経由のアップロード（ファイルを受信してBlobへ再送信）を省き、
+# 転送量とFunctionのメモリ使用量を削減する。
+# ※ Storage AccountのCORS設定で、フロントエンドのオリジンからのPUTを許可する必要がある。
+
+UPLOAD_SAS_EXPIRY_MINUTES = 15  # アップロード用SASの有効期限（分）
+
+def generate_upload_url(blob_service_client, blob_name: str) -> str:
+    """temp-uploadsコンテナへの書き込み専用SAS付きURLを生成
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント（アカウントキーを含む接続文字列で生成したもの）
+        blob_name: アップロード先のBlob名
+    
+    Returns:
+        str: SAS付きのBlob URL
+    """
+    sas_token = generate_blob_sas(
+        account_name=blob_service_client.account_name,
+        container_name="temp-uploads",
+        blob_name=blob_name,
+        account_key=blob_service_client.credential.account_key,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=UPLOAD_SAS_EXPIRY_MINUTES)
+    )
+    return f"{blob_service_client.get_blob_client('temp-uploads', blob_name).url}?{sas_token}"
+
+def sign_upload_token(blob_service_client, instance_id: str, mode: str, expires_at: int) -> str:
+    """アップロードトークンの署名を生成（Storage Accountのアカウントキーで署名する）
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント（アカウントキーを含む接続文字列で生成したもの）
+        instance_id: ジョブID
+        mode: 処理モード
+        expires_at: 有効期限（UNIX時刻）
+    
+    Returns:
+        str: HMAC-SHA256署名（16進数）
+    """
+    message = f"{instance_id}:{mode}:{expires_at}".encode("utf-8")
+    return hmac.new(blob_service_client.credential.account_key.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+def issue_upload_token(blob_service_client, instance_id: str, mode: str) -> str:
+    """/upload-sasで採番したジョブIDを/start-processingで検証するためのトークンを発行
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント
+        instance_id: ジョブID
+        mode: 処理モード
+    
+    Returns:
+        str: トークン（{有効期限}.{署名}）
+    """
+    expires_at = int(time.time()) + UPLOAD_SAS_EXPIRY_MINUTES * 60
+    return f"{expires_at}.{sign_upload_token(blob_service_client, instance_id, mode, expires_at)}"
+
+def verify_upload_token(blob_service_client, token: str, instance_id: str, mode: str) -> bool:
+    """アップロードトークンがこのジョブID・処理モードに対してサーバーが発行したものか検証
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント
+        token: /upload-sasで発行したトークン
+        instance_id: ジョブID
+        mode: 処理モード
+    
+    Returns:
+        bool: 署名が一致し、有効期限内の場合True
+    """
+    expires_at, _, signature = (token or "").partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign_upload_token(blob_service_client, instance_id, mode, int(expires_at)))
+
+def is_valid_instance_id(value) -> bool:
+    """サーバーが採番する形式（UUID）のジョブIDかどうかを判定
+    
+    Args:
+        value: クライアントから受け取ったジョブID
+    
+    Returns:
+        bool: 正規形式のUUID文字列の場合True
+    """
+    try:
+        return isinstance(value, str) and str(uuid.UUID(value)) == value
+    except ValueError:
+        return False
+
+@app.route(route="upload-sas", methods=["POST", "OPTIONS"])
+@app.durable_client_input(client_name="client")
+async def upload_sas(req: func.HttpRequest, client) -> func.HttpResponse:
+    """ブラウザから直接アップロードするためのSAS付きURLを発行
+    
+    処理フロー:
+    1. instance_idを採番（Orchestratorは/start-processingで起動する）
+    2. ファイルごとにBlob名を決定し、書き込み専用のSAS付きURLを生成
+    3. instance_idとアップロード先、instance_idを検証するためのトークンを返却
+    ブラウザは各URLへファイルをPUTした後、/start-processingを呼び出して処理を開始する。
+    
+    Args:
+        req: HTTPリクエスト（JSON）
+            - mode: 処理モード（"normal" or "diff"）
+            - files: 設計書Excelのファイル名のリスト（差分モードでは新版設計書）
+        client: Durable Functionsクライアント
+    
+    Returns:
+        HttpResponse: instance_idとアップロード先を含むレスポンス
+            - instance_id: ジョブID
+            - upload_token: /start-processingに渡すトークン（instance_idと処理モードに署名したもの）
+            - files: 設計書のアップロード先（filename, blob_name, url）
+            - old_structured_md, old_test_spec_md: 旧版ファイルのアップロード先（差分モードのみ）
+    """
+    if req.method == "OPTIONS":
+        return _PREFLIGHT_RESPONSE
+    
+    try:
+        body = req.get_json()
+        mode = body.get("mode", "normal")
+        filenames = body.get("files") or []
+        if not filenames:
+            return func.HttpResponse("ファイルが指定されていません", status_code=400, headers=CORS_HEADERS)
+        if mode not in ("normal", "diff"):
+            return func.HttpResponse("不正な処理モードです", status_code=400, headers=CORS_HEADERS)
+        # ファイル名はBlob名の一部になるため、パスを含めない
+        if any(not isinstance(filename, str) or not filename or "/" in filename for filename in filenames):
+            return func.HttpResponse("不正なファイル名です", status_code=400, headers=CORS_HEADERS)
+        
+        instance_id = str(uuid.uuid4())
+        await asyncio.to_thread(ensure_container_exists, "temp-uploads")
+        blob_service_client = get_blob_service_client()
+        
+        # Blob名は既存のアップロードと同じ命名規則にする
+        prefix = "file" if mode == "normal" else "new_excel"
+        response_data = {
+            "instance_id": instance_id,
+            "upload_token": issue_upload_token(blob_service_client, instance_id, mode),
+            "files": []
+        }
+        for idx, filename in enumerate(filenames):
+            blob_name = input_blob_name(instance_id, prefix, idx, filename)
+            response_data["files"].append({
+                "filename": filename,
+                "blob_name": blob_name,
+                "url": generate_upload_url(blob_service_client, blob_name)
+            })
+        if mode == "diff":
+            for key, name in (("old_structured_md", "old_structured.md"), ("old_test_spec_md", "old_test_spec.md")):
+                blob_name = f"{instance_id}/input/{name}"
+                response_data[key] = {"blob_name": blob_name, "url": generate_upload_url(blob_service_client, blob_name)}
+        
+        return func.HttpResponse(
+            json.dumps(response_data, ensure_ascii=False),
+            mimetype="application/json",
+            status_code=200,
+            headers=CORS_HEADERS
+        )
+    except Exception as e:
+        logging.error("Upload SAS error: %s", e)
+        return func.HttpResponse(f"エラー: {str(e)}", status_code=500, headers=CORS_HEADERS)
+
+
+@app.route(route="start-processing", methods=["POST", "OPTIONS"])
+@app.durable_client_input(client_name="client")
+async def start_processing(req: func.HttpRequest, client) -> func.HttpResponse:
+    """直接アップロードしたファイルで処理を開始
+    
+    /upload-sasで発行したアップロード先へのアップロード完了後に呼び出す。
+    ファイルの転送は行わず、入力データを渡してOrchestratorを起動するだけのため即座に応答する。
+    
+    クライアントが任意のジョブIDで処理を起動できないよう、以下を確認してから起動する:
+    - instance_idがUUID形式で、/upload-sasが発行したトークンの署名と一致すること
+    - 同じinstance_idのジョブがまだ存在しないこと（二重起動・既存ジョブの上書き防止）
+    - 入力ファイルがすべてアップロード済みであること
+    
+    Args:
+        req: HTTPリクエスト（JSON）
+            - instance_id: /upload-sasで取得したジョブID
+            - upload_token: /upload-sasで取得したトークン
+            - mode: 処理モード（"normal" or "diff"）
+            - files: アップロードした設計書（filename, blob_name）のリスト（/upload-sasの応答と同じ順序）
+            - granularity: テスト粒度（"simple" or "detailed"）
+        client: Durable Functionsクライアント
+    
+    Returns:
+        HttpResponse: instance_idとステータス確認用URLを含むレスポンス
+    """
+    if req.method == "OPTIONS":
+        return _PREFLIGHT_RESPONSE
+    
+    try:
+        body = req.get_json()
+        instance_id = body.get("instance_id")
+        mode = body.get("mode", "normal")
+        files = body.get("files") or []
+        if not instance_id or not files:
+            return func.HttpResponse("必要なパラメータが指定されていません", status_code=400, headers=CORS_HEADERS)
+        
+        # ========== 1. サーバーが発行したジョブIDか検証 ==========
+        blob_service_client = get_blob_service_client()
+        if mode not in ("normal", "diff") or not is_valid_instance_id(instance_id) \
+                or not verify_upload_token(blob_service_client, body.get("upload_token"), instance_id, mode):
+            return func.HttpResponse("不正なジョブIDです", status_code=403, headers=CORS_HEADERS)
+        
+        # 既に起動済み（または同じIDの既存ジョブがある）場合は起動しない
+        existing = await client.get_status(instance_id)
+        if existing and existing.runtime_status is not None:
+            return func.HttpResponse("このジョブは既に開始されています", status_code=409, headers=CORS_HEADERS)
+        
+        # ========== 2. ファイル参照を検証 ==========
+        # 他のジョブのBlobを参照できないよう、Blob名は/upload-sasと同じ命名規則で組み立てたものに限定する
+        input_prefix = f"{instance_id}/input/"
+        prefix = "file" if mode == "normal" else "new_excel"
+        file_refs = []
+        for idx, file in enumerate(files):
+            filename = file.get("filename")
+            if not isinstance(filename, str) or not filename or "/" in filename \
+                    or file.get("blob_name") != input_blob_name(instance_id, prefix, idx, filename):
+                return func.HttpResponse("不正なファイル参照です", status_code=400, headers=CORS_HEADERS)
+            file_refs.append({
+                "filename": filename,
+                "blob_name": file["blob_name"],
+                "container": "temp-uploads"
+            })
+        
+        input_data = {
+            "mode": mode,
+            "files": file_refs,
+            "granularity": body.get("granularity", "simple"),
+            "instance_id": instance_id
+        }
+        if mode == "diff":
+            input_data["old_structured_md_blob"] = f"{input_prefix}old_structured.md"
+            input_data["old_test_spec_md_blob"] = f"{input_prefix}old_test_spec.md"
+        
+        # ========== 3. 入力ファイルがアップロード済みか確認 ==========
+        # 未アップロードのままActivityを開始すると、処理の途中でダウンロードに失敗するため事前に確認する
+        container_client = blob_service_client.get_container_client("temp-uploads")
+        blob_names = [ref["blob_name"] for ref in file_refs]
+        if mode == "diff":
+            blob_names += [input_data["old_structured_md_blob"], input_data["old_test_spec_md_blob"]]
+        exists = await asyncio.gather(*(
+            asyncio.to_thread(container_client.get_blob_client(blob_name).exists) for blob_name in blob_names
+        ))
+        if not all(exists):
+            return func.HttpResponse("アップロードが完了していないファイルがあります", status_code=400, headers=CORS_HEADERS)
         
-        response = client.create_check_status_response(req, instance_id)
-        response.headers.update(CORS_HEADERS)
-        return response
+        # ========== 4. Orchestratorを起動 ==========
+        return await start_orchestrator(req, client, instance_id, input_data)
         
     except Exception as e:
-        logging.error(f"Diff starter error: {e}")
+        logging.error("Start processing error: %s", e)
         return func.HttpResponse(f"エラー: {str(e)}", status_code=500, headers=CORS_HEADERS)
 
 
 # ==================== Orchestrator ====================
 # Orchestrator関数は、処理全体の流れを管理する役割を持つ。
-# - Starter関数からのイベントを待機
+# - Starter関数から起動時の入力データを受け取る
 # - Activity関数を呼び出して実際の処理を実行
 # - 進捗状態を保持（set_custom_status）
 # - 処理結果を返却
@@ -292,7 +751,7 @@ def orchestrator(context: df.DurableOrchestrationContext):
     """テスト仕様書生成処理を管理するOrchestrator
     
     処理フロー:
-    1. Starter関数からのイベント（start_processing）を待機
+    1. Starter関数から渡された入力データを取得
     2. 初期進捗ステータスを設定
     3. Activity関数（process_test_generation）を呼び出し
     4. 完了ステータスを設定
@@ -307,21 +766,17 @@ def orchestrator(context: df.DurableOrchestrationContext):
         dict: Activity関数の実行結果（Blob参照情報）
     """
     try:
-        # ========== 1. Starter関数からのイベントを待機 ==========
-        # wait_for_external_eventは、raise_eventで送信されたデータを受信する
-        # イベント名: "start_processing"
+        # ========== 1. Starter関数から渡された入力データを取得 ==========
+        # get_inputは、start_newのclient_inputで渡されたデータを返す
         # 
         # リプレイ機構について:
         # Durable Functionsは、障害発生時に処理を再開するため、
         # Orchestrator関数を最初から再実行（リプレイ）する。
         # is_replayingフラグで、リプレイ中かどうかを判定できる。
-        if not context.is_replaying:
-            logging.info(f"Orchestrator waiting for event: {context.instance_id}")
-        
-        input_data = yield context.wait_for_external_event("start_processing")
+        input_data = context.get_input()
         
         if not context.is_replaying:
-            logging.info(f"Orchestrator received event: {context.instance_id}")
+            logging.info("Orchestrator started: %s", context.instance_id)
         
         # ========== 2. 初期進捗ステータスを設定 ==========
         # set_custom_statusで設定した情報は、/api/status/{instanceId}で取得可能
@@ -349,7 +804,7 @@ def orchestrator(context: df.DurableOrchestrationContext):
         
     except Exception as e:
         # エラー発生時は失敗ステータスを設定
-        logging.error(f"Orchestrator error: {e}")
+        logging.error("Orchestrator error: %s", e)
         context.set_custom_status({
             "stage": "failed",
             "progress": 0,
@@ -365,6 +820,53 @@ def orchestrator(context: df.DurableOrchestrationContext):
 # - 外部リソース（Blob Storage、LLM API）へのアクセスが可能
 # - 進捗情報をBlob Storageに保存してフロントエンドに通知
 
+# Blob Storageから取得したバイナリデータを、coreモジュールが期待する
+# ファイルオブジェクト形式にラップする。
+class FileWrapper:
+    """Blob Storage上のファイルをファイルオブジェクトとして扱うラッパー
+    
+    coreモジュールは、HTTPリクエストから受け取ったファイルオブジェクトを想定しているため、
+    同じインターフェース（filename, stream, read）を提供する。
+    Blobは最初にアクセスされた時点で1回だけダウンロードし、取得したデータを複製せずに使い回す。
+    """
+    def __init__(self, filename, blob_client):
+        self.filename = filename  # 元のファイル名
+        self._blob_client = blob_client
+        self._content = None
+        self._stream = None
+    
+    def read(self):
+        """core/utils.pyとの互換性のためのreadメソッド
+        
+        Returns:
+            bytes: ファイルの内容
+        """
+        if self._content is None:
+            # 大きいファイルは複数の範囲要求に分けて並列でダウンロード
+            self._content = self._blob_client.download_blob(max_concurrency=4).readall()
+        return self._content
+    
+    @property
+    def stream(self):
+        """ファイルの内容を読み込むストリーム（アクセスされた場合のみ生成）"""
+        if self._stream is None:
+            self._stream = io.BytesIO(self.read())
+        return self._stream
+
+def prefetch_files(files: list[FileWrapper]):
+    """複数のFileWrapperの内容を並列でダウンロード
+    
+    coreモジュールはファイルを1つずつ順に読み込むため、そのままではダウンロードの待ち時間がファイル数分積み重なる。
+    処理開始前にまとめて取得しておき、待ち時間をほぼ1回分に短縮する。
+    
+    Args:
+        files: ダウンロードするFileWrapperのリスト
+    """
+    if len(files) < 2:
+        return  # 1件のみの場合は並列化の効果がないため、従来どおり読み込み時に取得する
+    with ThreadPoolExecutor(max_workers=min(len(files), 8), thread_name_prefix="blob-prefetch") as pool:
+        list(pool.map(FileWrapper.read, files))
+
 @app.activity_trigger(input_name="inputData")
 def process_test_generation(inputData) -> dict:
     """テスト仕様書生成の実処理を実行するActivity関数
@@ -392,9 +894,6 @@ def process_test_generation(inputData) -> dict:
             - filename: ファイル名
             - container: コンテナ名
     """
-    import io
-    from datetime import datetime
-    
     # ========== 1. 入力データの解析 ==========
     # Durable FunctionsはJSON文字列として渡す場合があるため、パース処理を追加
     if isinstance(inputData, str):
@@ -404,13 +903,16 @@ def process_test_generation(inputData) -> dict:
     granularity = inputData["granularity"]  # テスト粒度（simple or detailed）
     instance_id = inputData["instance_id"]  # ジョブID（進捗管理・結果保存に使用）
     
+    # Durable Functionsのメッセージにはサイズ上限があるため、入力にはBlob参照のみを渡す
+    # （ファイル内容が直接含まれている場合は呼び出し元の誤りとして即座に失敗させる）
+    if not all(isinstance(file_ref, dict) and "blob_name" in file_ref for file_ref in inputData["files"]):
+        raise ValueError("Activityの入力にはファイル内容ではなくBlob参照を指定してください")
+    
     # ========== 2. 進捗更新用のヘルパー関数を定義 ==========
     # Orchestrator内ではBlob Storageへの直接アクセスが禁止されているため、
     # Activity関数内で進捗情報をBlob Storageに保存する。
     # この関数は、coreモジュールのProgressManagerから呼び出される。
     # 開始時刻を記録（JST）
-    from datetime import timezone, timedelta
-    import uuid
     jst = timezone(timedelta(hours=9))
     start_time = datetime.now(jst).isoformat()
     
@@ -418,28 +920,18 @@ def process_test_generation(inputData) -> dict:
     seq_number = str(uuid.uuid4())
     
     # トークン統計を記録する変数
-    token_stats = {
-        "total_input_tokens": 0,
-        "total_output_tokens": 0
-    }
+    token_stats = {key: 0 for key in utils.TOKEN_STATS_KEYS}
     
-    def update_progress_direct(stage, message, progress, token_usage=None):
+    def write_progress(stage, message, progress):
         """進捗情報をBlob Storage（progressコンテナ）に保存
         
         Args:
             stage: 処理ステージ（structuring, perspectives, testspec, converting, completed）
             message: 表示メッセージ
             progress: 進捗率（0-100）
-            token_usage: トークン使用量（オプション）
         """
         try:
-            # トークン統計を更新
-            if token_usage:
-                token_stats["total_input_tokens"] += token_usage.get("input_tokens", 0)
-                token_stats["total_output_tokens"] += token_usage.get("output_tokens", 0)
-            
-            blob_service_client = get_blob_service_client()
-            ensure_container_exists("progress")  # progressコンテナを作成
+            blob_service_client = get_blob_service_client("progress")
             
             # 進捗情報をJSON形式で保存（ファイル名: {instance_id}.json）
             blob_client = blob_service_client.get_blob_client("progress", f"{instance_id}.json")
@@ -453,45 +945,42 @@ def process_test_generation(inputData) -> dict:
                 "token_stats": token_stats
             }
             blob_client.upload_blob(json.dumps(data, ensure_ascii=False), overwrite=True)
-            logging.info(f"進捗更新: {stage} ({progress}%)")
-        except Exception as e:
-            # 進捗更新失敗は処理を中断しない（ログのみ）
-            logging.error(f"進捗更新失敗: {e}")
+            logging.info("進捗更新: %s (%s%%)", stage, progress)  # 遅延フォーマット（INFO無効時は文字列を生成しない）
+        except Exception:
+            # 進捗更新失敗は処理を中断しない（ログのみ、スタックトレースも記録）
+            logging.exception("進捗更新失敗")
+    
+    # シート構造化などで短時間に続く更新は間引き、間隔ごとに最新の進捗のみ書き込む
+    progress_writer = ThrottledProgressWriter(write_progress)
+    
+    def update_progress_direct(stage, message, progress, token_usage=None):
+        """進捗を更新（Blobへの書き込みは間引かれ、最後の更新は必ず書き込まれる）
+        
+        Args:
+            stage: 処理ステージ（structuring, perspectives, testspec, converting, completed）
+            message: 表示メッセージ
+            progress: 進捗率（0-100）
+            token_usage: トークン使用量（オプション）
+        """
+        # トークン統計を更新
+        if token_usage:
+            for stats_key, usage_key in utils.TOKEN_STATS_KEYS.items():
+                token_stats[stats_key] += token_usage.get(usage_key, 0)
+        progress_writer.update(stage, message, progress, force=progress >= 100)
     
     # ========== 3. coreモジュールにコールバック関数を設定 ==========
     # coreモジュールのProgressManagerが、このコールバック関数を呼び出して進捗を更新する
-    set_progress_callback(update_progress_direct)
+    ensure_container_exists("progress")  # progressコンテナを作成（進捗更新のたびには確認しない）
+    set_progress_callback(update_progress_direct, progress_writer.flush)
     
     blob_service_client = get_blob_service_client()
     
-    # ========== 4. ファイルラッパークラスの定義 ==========
-    # Blob Storageから取得したバイナリデータを、coreモジュールが期待する
-    # ファイルオブジェクト形式にラップする。
-    class FileWrapper:
-        """Blob Storageから取得したデータをファイルオブジェクトとして扱うラッパー
-        
-        coreモジュールは、HTTPリクエストから受け取ったファイルオブジェクトを想定しているため、
-        同じインターフェース（filename, stream, read）を提供する。
-        """
-        def __init__(self, filename, content):
-            self.filename = filename  # 元のファイル名
-            self.stream = io.BytesIO(content)  # バイナリデータをストリームに変換
-        
-        def read(self):
-            """core/utils.pyとの互換性のためのreadメソッド
-            
-            Returns:
-                bytes: ファイルの内容
-            """
-            self.stream.seek(0)  # ストリームの先頭に戻す
-            return self.stream.read()
-    
     try:
-        # ========== 5. 処理モードに応じた実行 ==========
+        # ========== 4. 処理モードに応じた実行 ==========
         if mode == "normal":
             # ========== 通常モード: 設計書からテスト仕様書を生成 ==========
             
-            # 5-1. Blob Storageからファイルを取得
+            # 4-1. Blob Storageからファイルを取得
             files = []
             for file_ref in inputData["files"]:
                 # Blob参照情報からファイルを取得
@@ -499,24 +988,22 @@ def process_test_generation(inputData) -> dict:
                     container=file_ref["container"],  # temp-uploads
                     blob=file_ref["blob_name"]  # {instance_id}/input/file_0_xxx.xlsx
                 )
-                content = blob_client.download_blob().readall()  # バイナリデータを取得
-                files.append(FileWrapper(file_ref["filename"], content))
+                files.append(FileWrapper(file_ref["filename"], blob_client))
+            prefetch_files(files)  # 複数ファイルは並列でダウンロード（1件のみの場合は解析時に取得）
             
-            # 5-2. coreモジュールを呼び出してテスト仕様書を生成
+            # 4-2. coreモジュールを呼び出してテスト仕様書を生成
             # normal_mode.generate_normal_test_spec()は以下を実行:
             # - Excel解析 → Markdown構造化
             # - LLMでテスト観点抽出
             # - LLMでテスト仕様書生成
             # - Excel/CSV変換
             # - ZIPファイル作成
-            zip_bytes, core_token_stats = normal_mode.generate_normal_test_spec(files, granularity, instance_id)
+            zip_file, core_token_stats = normal_mode.generate_normal_test_spec(files, granularity, instance_id)
             
             # トークン統計を更新
-            token_stats["total_input_tokens"] = core_token_stats["total_input_tokens"]
-            token_stats["total_output_tokens"] = core_token_stats["total_output_tokens"]
+            token_stats.update(core_token_stats)
             
             # 複数ファイルの場合は_で連結、単一ファイルの場合はそのまま使用
-            from pathlib import Path
             if len(files) == 1:
                 base_name = Path(files[0].filename).stem
             else:
@@ -526,33 +1013,31 @@ def process_test_generation(inputData) -> dict:
         else:
             # ========== 差分モード: 新旧設計書を比較してテスト仕様書の差分版を生成 ==========
             
-            # 5-1. 新版設計書をBlob Storageから取得
+            # 4-1. 新版設計書をBlob Storageから取得
             files = []
             for file_ref in inputData["files"]:
                 blob_client = blob_service_client.get_blob_client(
                     container=file_ref["container"],
                     blob=file_ref["blob_name"]
                 )
-                content = blob_client.download_blob().readall()
-                files.append(FileWrapper(file_ref["filename"], content))
+                files.append(FileWrapper(file_ref["filename"], blob_client))
+            prefetch_files(files)  # 複数ファイルは並列でダウンロード（1件のみの場合は解析時に取得）
             
-            # 5-2. 旧版の構造化設計書を取得
+            # 4-2. 旧版の構造化設計書を取得
             blob_client = blob_service_client.get_blob_client(
                 container="temp-uploads",
                 blob=inputData["old_structured_md_blob"]  # {instance_id}/input/old_structured.md
             )
-            old_structured_content = blob_client.download_blob().readall()
-            old_structured_md = FileWrapper("old_structured.md", old_structured_content)
+            old_structured_md = FileWrapper("old_structured.md", blob_client)
             
-            # 5-3. 旧版のテスト仕様書を取得
+            # 4-3. 旧版のテスト仕様書を取得
             blob_client = blob_service_client.get_blob_client(
                 container="temp-uploads",
                 blob=inputData["old_test_spec_md_blob"]  # {instance_id}/input/old_test_spec.md
             )
-            old_spec_content = blob_client.download_blob().readall()
-            old_test_spec_md = FileWrapper("old_test_spec.md", old_spec_content)
+            old_test_spec_md = FileWrapper("old_test_spec.md", blob_client)
             
-            # 5-4. coreモジュールを呼び出して差分版テスト仕様書を生成
+            # 4-4. coreモジュールを呼び出して差分版テスト仕様書を生成
             # diff_mode.generate_diff_test_spec()は以下を実行:
             # - 新版Excel解析 → Markdown構造化
             # - LLMで差分検知
@@ -560,47 +1045,57 @@ def process_test_generation(inputData) -> dict:
             # - LLMで差分版テスト仕様書生成
             # - Excel/CSV変換
             # - ZIPファイル作成
-            zip_bytes, core_token_stats = diff_mode.generate_diff_test_spec(
+            zip_file, core_token_stats = diff_mode.generate_diff_test_spec(
                 files, old_structured_md, old_test_spec_md, granularity, instance_id
             )
             
             # トークン統計を更新
-            token_stats["total_input_tokens"] = core_token_stats["total_input_tokens"]
-            token_stats["total_output_tokens"] = core_token_stats["total_output_tokens"]
+            token_stats.update(core_token_stats)
             
             # 複数ファイルの場合は_で連結、単一ファイルの場合はそのまま使用
-            from pathlib import Path
             if len(files) == 1:
                 base_name = Path(files[0].filename).stem
             else:
                 base_name = "_".join(Path(f.filename).stem for f in files)
             filename = f"{base_name}_テスト仕様書_差分版.zip"
         
-        # ========== 6. 生成結果をBlob Storageに保存 ==========
+        # ========== 5. 生成結果をBlob Storageに保存 ==========
         ensure_container_exists("results")  # resultsコンテナを作成
         
         # Blobパス: {instance_id}/{filename}
         # 例: abc123-def456/テスト仕様書.zip
         blob_name = f"{instance_id}/{filename}"
         blob_client = blob_service_client.get_blob_client(container="results", blob=blob_name)
-        blob_client.upload_blob(zip_bytes, overwrite=True)
-        
-        logging.info(f"結果保存完了: {blob_name}")
         
         # 終了時刻を記録（JST）
         end_time = datetime.now(jst).isoformat()
         
+        # 履歴一覧に表示する情報はBlobメタデータとしても保存する（一覧取得時に結果ごとの読み込みを不要にする）
+        # メタデータはHTTPヘッダーで送信されるためASCIIの値のみとする（ファイル名はBlob名から取得）
+        metadata = {
+            "start_time": start_time,
+            "end_time": end_time,
+            "seq_number": seq_number,
+            **{key: str(value) for key, value in token_stats.items()}
+        }
+        # ZIPはファイルオブジェクトとして受け取り、bytesに展開せずストリームでアップロード
+        # （大きいZIPはブロックに分割され、max_concurrencyの数だけ並列でアップロードされる）
+        with zip_file:
+            blob_client.upload_blob(zip_file, overwrite=True, metadata=metadata, max_concurrency=4)
+        
+        logging.info("結果保存完了: %s", blob_name)
+        
         # 最終進捗情報を更新（終了時刻とトークン統計を含む）
         update_progress_direct("completed", "完了しました", 100)
         try:
-            blob_client = blob_service_client.get_blob_client("progress", f"{instance_id}.json")
+            blob_client = get_blob_service_client("progress").get_blob_client("progress", f"{instance_id}.json")
             progress_data = json.loads(blob_client.download_blob().readall())
             progress_data["end_time"] = end_time
             blob_client.upload_blob(json.dumps(progress_data, ensure_ascii=False), overwrite=True)
         except Exception as e:
-            logging.error(f"終了時刻の記録失敗: {e}")
+            logging.error("終了時刻の記録失敗: %s", e)
         
-        # ========== 7. Orchestratorに結果を返却 ==========
+        # ========== 6. Orchestratorに結果を返却 ==========
         # この情報は、Orchestratorの戻り値として/api/status/{instanceId}で取得可能
         return {
             "blob_name": blob_name,  # Blob Storage上のパス
@@ -613,14 +1108,24 @@ def process_test_generation(inputData) -> dict:
         }
         
     except Exception as e:
-        logging.error(f"Activity error: {e}")
+        logging.error("Activity error: %s", e)
         raise
+    
+    finally:
+        # 保留中の進捗を書き込み、タイマーを止める
+        progress_writer.flush()
 
 
 # ==================== Status ====================
 # Status関数は、ジョブの進捗状況を取得するエンドポイント。
 # フロントエンドが10秒間隔でポーリングして進捗を確認する。
 
+# instance_id -> (ETag, 進捗情報)。実行中のジョブについて前回取得した進捗を保持する
+# ポーリングが途絶えたジョブの分が溜まらないよう、最近参照したPROGRESS_CACHE_MAX_ENTRIES件のみ保持する（LRU）
+PROGRESS_CACHE_MAX_ENTRIES = 256
+_progress_cache = OrderedDict()
+_JOB_NOT_FOUND_BODY = json.dumps({"error": "ジョブが見つかりません"}, ensure_ascii=False)  # 内容が固定のため1回だけ生成する
+
 @app.route(route="status/{instanceId}", methods=["GET", "OPTIONS"])
 @app.durable_client_input(client_name="client")
 async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
@@ -628,7 +1133,7 @@ async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
     
     処理フロー:
     1. Orchestratorのステータスを取得（runtimeStatus）
-    2. Blob Storageから詳細な進捗情報を取得（customStatus）
+    2. 実行中の場合はBlob Storageから詳細な進捗情報を取得（customStatus）
     3. JSON形式でレスポンスを返却
     
     Args:
@@ -647,7 +1152,7 @@ async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
     """
     # CORS preflight対応
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     # URLパラメータからinstance_idを取得
     instance_id = req.route_params.get("instanceId")
@@ -660,7 +1165,7 @@ async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
         # ジョブが見つからない場合（無効なinstance_id）
         if not status:
             return func.HttpResponse(
-                json.dumps({"error": "ジョブが見つかりません"}, ensure_ascii=False),
+                _JOB_NOT_FOUND_BODY,
                 mimetype="application/json",
                 status_code=404,
                 headers=CORS_HEADERS
@@ -668,16 +1173,39 @@ async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
         
         # ========== 2. Blob Storageから詳細な進捗情報を取得 ==========
         # Orchestratorのset_custom_statusで設定した情報は粗い粒度のため、
-        # Activity関数がBlob Storageに保存した詳細な進捗情報を優先的に使用する。
+        # 実行中はActivity関数がBlob Storageに保存した詳細な進捗情報を優先的に使用する。
+        # 完了・失敗などの終了後はOrchestratorの最終ステータスで十分なため、Blobは読み込まない。
         custom_status = status.custom_status  # デフォルト値（Orchestratorの情報）
-        try:
-            blob_service_client = get_blob_service_client()
+        if status.runtime_status == df.OrchestrationRuntimeStatus.Running:
+            blob_service_client = get_blob_service_client("progress")
             blob_client = blob_service_client.get_blob_client("progress", f"{instance_id}.json")
-            progress_data = blob_client.download_blob().readall()
-            custom_status = json.loads(progress_data)  # Activity関数が保存した詳細情報
-        except:
-            # progressデータがない場合（処理開始直後など）は、Orchestratorの情報を使用
-            pass
+            etag, cached_status = _progress_cache.get(instance_id, (None, None))
+            
+            def read_progress():
+                # 前回取得時から更新されていない場合は、本文を転送せずにResourceNotModifiedErrorとなる
+                if etag:
+                    downloader = blob_client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+                else:
+                    downloader = blob_client.download_blob()
+                return downloader.properties.etag, json.loads(downloader.readall())
+            
+            try:
+                etag, custom_status = await asyncio.to_thread(read_progress)  # Activity関数が保存した詳細情報
+                _progress_cache[instance_id] = (etag, custom_status)
+                _progress_cache.move_to_end(instance_id)
+                while len(_progress_cache) > PROGRESS_CACHE_MAX_ENTRIES:
+                    _progress_cache.popitem(last=False)  # 最も長く参照されていないジョブを破棄
+            except ResourceNotModifiedError:
+                # 進捗が更新されていない場合は前回取得した内容を使用
+                custom_status = cached_status
+                if instance_id in _progress_cache:
+                    _progress_cache.move_to_end(instance_id)
+            except:
+                # progressデータがない場合（処理開始直後など）は、Orchestratorの情報を使用
+                pass
+        else:
+            # 終了したジョブの進捗はBlobから読み込まないため、保持していた内容を破棄
+            _progress_cache.pop(instance_id, None)
         
         # ========== 3. レスポンスデータを組み立て ==========
         response_data = {
@@ -701,7 +1229,7 @@ async def get_status(req: func.HttpRequest, client) -> func.HttpResponse:
         )
         
     except Exception as e:
-        logging.error(f"Status query error: {e}")
+        logging.error("Status query error: %s", e)
         return func.HttpResponse(
             json.dumps({"error": str(e)}, ensure_ascii=False),
             mimetype="application/json",
@@ -722,52 +1250,68 @@ async def list_results(req: func.HttpRequest) -> func.HttpResponse:
             - start_time: 処理開始時刻（JST）
             - end_time: 処理終了時刻（JST）
             - seq_number: 採番（タイムスタンプベース）
-            - token_stats: トークン統計（total_input_tokens, total_output_tokens）
+            - token_stats: トークン統計（total_input_tokens, total_output_tokens,
+                           total_cache_creation_tokens, total_cache_read_tokens）
     """
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     try:
         blob_service_client = get_blob_service_client()
-        ensure_container_exists("results")
-        ensure_container_exists("progress")
+        await asyncio.to_thread(ensure_container_exists, "results")
         results_container = blob_service_client.get_container_client("results")
-        progress_container = blob_service_client.get_container_client("progress")
+        progress_container = get_blob_service_client("progress").get_container_client("progress")
         
-        results = []
-        seen_ids = set()
-        
-        for blob in results_container.list_blobs():
-            instance_id = blob.name.split("/")[0]
-            if instance_id in seen_ids:
-                continue
-            seen_ids.add(instance_id)
+        def collect_results():
+            # 一覧取得と（メタデータがない結果の）進捗情報の取得は同期版SDKのため、まとめてスレッドで実行する
+            results = []
+            seen_ids = set()
             
-            # 進捗情報から詳細を取得
-            start_time = None
-            end_time = None
-            seq_number = None
-            token_stats = None
+            # 一覧取得時にメタデータも取得する（結果ごとの追加リクエストを不要にする）
+            for blob in results_container.list_blobs(include=["metadata"]):
+                instance_id = blob.name.split("/")[0]
+                if instance_id in seen_ids:
+                    continue
+                seen_ids.add(instance_id)
             
-            try:
-                progress_blob = progress_container.get_blob_client(f"{instance_id}.json")
-                progress_data = json.loads(progress_blob.download_blob().readall())
-                start_time = progress_data.get("start_time")
-                end_time = progress_data.get("end_time")
-                seq_number = progress_data.get("seq_number")
-                token_stats = progress_data.get("token_stats")
-            except Exception as e:
-                logging.warning(f"進捗情報の取得失敗 ({instance_id}): {e}")
+                # 詳細情報を取得
+                start_time = None
+                end_time = None
+                seq_number = None
+                token_stats = None
             
-            results.append({
-                "instanceId": instance_id,
-                "filename": blob.name.split("/")[-1],
-                "size": blob.size,
-                "start_time": start_time,
-                "end_time": end_time,
-                "seq_number": seq_number or 0,
-                "token_stats": token_stats
-            })
+                metadata = blob.metadata or {}
+                if "start_time" in metadata:
+                    # 結果保存時にメタデータとして記録した情報を使用
+                    start_time = metadata["start_time"]
+                    end_time = metadata.get("end_time")
+                    seq_number = metadata.get("seq_number")
+                    # キャッシュ分の項目がない結果（集計対応前に作成されたもの）は0とする
+                    token_stats = {key: int(metadata.get(key, 0)) for key in utils.TOKEN_STATS_KEYS}
+                else:
+                    # メタデータがない結果（メタデータ保存対応前に作成されたもの）は進捗情報から取得
+                    try:
+                        progress_blob = progress_container.get_blob_client(f"{instance_id}.json")
+                        progress_data = json.loads(progress_blob.download_blob().readall())
+                        start_time = progress_data.get("start_time")
+                        end_time = progress_data.get("end_time")
+                        seq_number = progress_data.get("seq_number")
+                        token_stats = progress_data.get("token_stats")
+                    except Exception as e:
+                        logging.warning("進捗情報の取得失敗 (%s): %s", instance_id, e)
+            
+                results.append({
+                    "instanceId": instance_id,
+                    "filename": blob.name.split("/")[-1],
+                    "size": blob.size,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "seq_number": seq_number or 0,
+                    "token_stats": token_stats
+                })
+            return results
+        
+        results = await asyncio.to_thread(collect_results)
         
         # seq_numberで降順ソート（最新が上）
         results.sort(key=lambda x: x.get("start_time", ""), reverse=True)
@@ -779,7 +1323,7 @@ async def list_results(req: func.HttpRequest) -> func.HttpResponse:
             headers=CORS_HEADERS
         )
     except Exception as e:
-        logging.error(f"List results error: {e}")
+        logging.error("List results error: %s", e)
         return func.HttpResponse(
             json.dumps({"error": str(e)}, ensure_ascii=False),
             mimetype="application/json",
@@ -788,6 +1332,33 @@ async def list_results(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 # ==================== Download ====================
+DOWNLOAD_SAS_EXPIRY_MINUTES = 10  # ダウンロード用SASの有効期限（分）
+
+def generate_download_url(blob_service_client, blob_name: str, filename: str) -> str:
+    """resultsコンテナのZIPファイルへの読み取り専用SAS付きURLを生成
+    
+    Args:
+        blob_service_client: Blob Storage操作用クライアント（アカウントキーを含む接続文字列で生成したもの）
+        blob_name: ダウンロードするBlob名
+        filename: ダウンロード時のファイル名
+    
+    Returns:
+        str: SAS付きのBlob URL
+    """
+    sas_token = generate_blob_sas(
+        account_name=blob_service_client.account_name,
+        container_name="results",
+        blob_name=blob_name,
+        account_key=blob_service_client.credential.account_key,
+        permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=DOWNLOAD_SAS_EXPIRY_MINUTES),
+        # Content-Disposition: ブラウザにダウンロードを指示
+        # filename*=UTF-8'': RFC 5987形式（日本語ファイル名対応）
+        content_disposition=f"attachment; filename*=UTF-8''{quote(filename)}",
+        content_type="application/zip"  # ZIPファイルのMIMEタイプ
+    )
+    return f"{blob_service_client.get_blob_client('results', blob_name).url}?{sas_token}"
+
 # Download関数は、生成されたZIPファイルをダウンロードするエンドポイント。
 # フロントエンドは、ジョブ完了後にこのエンドポイントを呼び出してファイルを取得する。
 
@@ -795,66 +1366,74 @@ async def list_results(req: func.HttpRequest) -> func.HttpResponse:
 async def download_result(req: func.HttpRequest) -> func.HttpResponse:
     """生成されたZIPファイルをダウンロード
     
+    ZIPファイルはFunctionを経由させず、読み取り専用のSAS付きURLを返して
+    ブラウザがBlob Storageから直接ダウンロードする（Functionのメモリ・転送量を使わない）。
+    フロントエンドはfetchではなくページ遷移（リンク）でURLを開くため、Blob StorageのCORS設定は不要。
+    （fetchでリダイレクトを追うと、Blob Storageへのリクエストが Origin: null となりCORSで拒否される）
+    
     処理フロー:
-    1. Blob Storage（resultsコンテナ）からZIPファイルを取得
-    2. Content-Dispositionヘッダーでファイル名を指定
-    3. バイナリデータをレスポンスとして返却
+    1. Blob Storage（resultsコンテナ）からZIPファイルのBlob名を取得
+       （ファイル名が指定された場合はBlob名が確定するため、一覧取得を省略する）
+    2. Content-Dispositionでファイル名を指定したSAS付きURLを生成
+    3. SAS付きURLをJSONで返す
     
     Args:
         req: HTTPリクエスト
             - instanceId: ジョブID（URLパラメータ）
+            - filename: ZIPファイル名（クエリパラメータ、省略可。/api/list-resultsのfilename）
     
     Returns:
-        HttpResponse: ZIPファイルのバイナリデータ
+        HttpResponse: {"url": SAS付きURL, "filename": ZIPファイル名}
     """
     # CORS preflight対応
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     # URLパラメータからinstance_idを取得
     instance_id = req.route_params.get("instanceId")
+    filename = req.params.get("filename")  # 指定されていればBlob名を直接組み立てる
+    
+    # 他のジョブの結果を参照できないよう、ファイル名にはパスを含めない
+    if filename and "/" in filename:
+        return func.HttpResponse("不正なファイル名です", status_code=400, headers=CORS_HEADERS)
     
     try:
         # ========== 1. Blob Storageからファイルを検索 ==========
         blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client("results")
         
-        # instance_idで始まるBlobを検索
-        # 例: abc123-def456/テスト仕様書.zip
-        blobs = list(container_client.list_blobs(name_starts_with=f"{instance_id}/"))
-        
-        # ファイルが見つからない場合（処理未完了 or エラー）
-        if not blobs:
-            return func.HttpResponse("ファイルが見つかりません", status_code=404, headers=CORS_HEADERS)
-        
-        # ========== 2. ZIPファイルをダウンロード ==========
-        # 最初に見つかったBlobを取得（通常は1つのみ）
-        blob_name = blobs[0].name
-        blob_client = blob_service_client.get_blob_client(container="results", blob=blob_name)
-        
-        # バイナリデータを取得
-        zip_bytes = blob_client.download_blob().readall()
+        if filename:
+            # Blob名が確定しているため、一覧取得を行わない
+            # （Blobが存在しない場合は、URLを開いた際にBlob Storageが404を返す）
+            blob_name = f"{instance_id}/{filename}"
+        else:
+            # instance_idで始まるBlobを検索（同期版SDKのため、スレッドで実行する）
+            # 例: abc123-def456/テスト仕様書.zip
+            blobs = await asyncio.to_thread(lambda: list(container_client.list_blobs(name_starts_with=f"{instance_id}/")))
+            
+            # ファイルが見つからない場合（処理未完了 or エラー）
+            if not blobs:
+                return func.HttpResponse("ファイルが見つかりません", status_code=404, headers=CORS_HEADERS)
+            
+            # 最初に見つかったBlobを取得（通常は1つのみ）
+            blob_name = blobs[0].name
         
-        # ========== 3. ファイル名を抽出してエンコード ==========
+        # ========== 2. SAS付きURLを生成 ==========
         # Blobパス: {instance_id}/{filename} から filename を抽出
-        filename = blob_name.split("/")[-1]  # 例: テスト仕様書.zip
-        encoded_filename = quote(filename)  # URLエンコード（日本語対応）
-        
-        # ========== 4. レスポンスヘッダーを設定 ==========
-        headers = {
-            # Content-Disposition: ブラウザにダウンロードを指示
-            # filename*=UTF-8'': RFC 5987形式（日本語ファイル名対応）
-            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
-            "Content-Type": "application/zip",  # ZIPファイルのMIMEタイプ
-            **CORS_HEADERS  # CORS設定を追加
-        }
+        zip_filename = blob_name.split("/")[-1]
+        download_url = generate_download_url(blob_service_client, blob_name, zip_filename)
         
-        # ========== 5. バイナリデータをレスポンスとして返却 ==========
-        return func.HttpResponse(zip_bytes, status_code=200, headers=headers)
+        # ========== 3. SAS付きURLを返す ==========
+        return func.HttpResponse(
+            json.dumps({"url": download_url, "filename": zip_filename}, ensure_ascii=False),
+            mimetype="application/json",
+            status_code=200,
+            headers=CORS_HEADERS
+        )
         
     except Exception as e:
         # ダウンロードエラー（Blob Storage接続エラー、権限不足など）
-        logging.error(f"Download error: {e}")
+        logging.error("Download error: %s", e)
         return func.HttpResponse(f"エラー: {str(e)}", status_code=500, headers=CORS_HEADERS)
 
 # ==================== Delete Result ====================
@@ -862,25 +1441,30 @@ async def download_result(req: func.HttpRequest) -> func.HttpResponse:
 async def delete_result(req: func.HttpRequest) -> func.HttpResponse:
     """処理結果を削除"""
     if req.method == "OPTIONS":
-        return func.HttpResponse(status_code=200, headers=CORS_HEADERS)
+        return _PREFLIGHT_RESPONSE
     
     instance_id = req.route_params.get("instanceId")
     
     try:
         blob_service_client = get_blob_service_client()
         
-        # resultsコンテナから削除
-        container_client = blob_service_client.get_container_client("results")
-        blobs = list(container_client.list_blobs(name_starts_with=f"{instance_id}/"))
-        for blob in blobs:
-            container_client.delete_blob(blob.name)
+        def delete_results():
+            # resultsコンテナから削除（複数のBlobは1回のバッチ要求でまとめて削除）
+            container_client = blob_service_client.get_container_client("results")
+            blob_names = [blob.name for blob in container_client.list_blobs(name_starts_with=f"{instance_id}/")]
+            if blob_names:
+                container_client.delete_blobs(*blob_names)
         
-        # progressコンテナから削除
-        try:
-            progress_client = blob_service_client.get_blob_client("progress", f"{instance_id}.json")
-            progress_client.delete_blob()
-        except:
-            pass
+        def delete_progress():
+            # progressコンテナから削除
+            try:
+                progress_client = get_blob_service_client("progress").get_blob_client("progress", f"{instance_id}.json")
+                progress_client.delete_blob()
+            except:
+                pass
+        
+        # 両コンテナの削除を並列で実行（同期版SDKの呼び出しはスレッドで実行し、イベントループを止めない）
+        await asyncio.gather(asyncio.to_thread(delete_results), asyncio.to_thread(delete_progress))
         
         return func.HttpResponse(
             json.dumps({"message": "削除しました"}, ensure_ascii=False),
@@ -889,7 +1473,7 @@ async def delete_result(req: func.HttpRequest) -> func.HttpResponse:
             headers=CORS_HEADERS
         )
     except Exception as e:
-        logging.error(f"Delete error: {e}")
+        logging.error("Delete error: %s", e)
         return func.HttpResponse(
             json.dumps({"error": str(e)}, ensure_ascii=False),
             mimetype="application/json",
@@ -3,6 +3,7 @@ LLMプロンプト定義
 
 このファイルには、各処理ステップで使用するLLMプロンプトを定義しています。
 - STRUCTURING_PROMPT: ExcelデータをMarkdownに構造化
+- STRUCTURING_BATCH_DELIMITER/STRUCTURING_BATCH_INSTRUCTION: 複数シートを1回で構造化する際の区切り行と追加指示
 - EXTRACT_TEST_PERSPECTIVES_PROMPT: テスト観点の抽出
 - CREATE_TEST_SPEC_PROMPT_SIMPLE/DETAILED: テスト仕様書の生成（粒度別）
 - DIFF_DETECTION_PROMPT: 設計書の差分検知
@@ -52,6 +53,20 @@ STRUCTURING_PROMPT = '''
 設計書の情報を完全トレースした形式であること。
 '''
 
+# 複数シートをまとめて構造化する場合のシート区切り行
+# （システムプロンプトを固定してプロンプトキャッシュを効かせるため、固定文字列とする）
+STRUCTURING_BATCH_DELIMITER = "===SHEET_BOUNDARY_8f3a1c==="
+
+# 複数シートをまとめて構造化する場合に、STRUCTURING_PROMPTの末尾に追加する指示
+STRUCTURING_BATCH_INSTRUCTION = f'''
+## 複数シートの入力について
+入力には複数の Excel シートが含まれ、各シートの直前に区切り行「{STRUCTURING_BATCH_DELIMITER}」が置かれています。
+・シートごとに独立して上記ルールに従い構造化すること
+・出力では、各シートの構造化結果の直前に、入力と同じ区切り行「{STRUCTURING_BATCH_DELIMITER}」をそのまま 1 行で出力すること
+・シートの順序を入力と同じに保ち、シートの統合・省略は行わないこと
+・区切り行以外の説明文や前置きは出力しないこと
+'''
+
 EXTRACT_TEST_PERSPECTIVES_PROMPT = '''
 あなたはソフトウェアテストの専門家です。提供された設計書からテスト観点を抽出してください。
 
@@ -0,0 +1,60 @@
+import io
+import logging
+import zipfile
+from types import SimpleNamespace
+
+from core import diff_mode, llm_service, utils
+
+DIGEST = "0" * 64
+ZERO_USAGE = {"input_tokens": 0, "output_tokens": 0, "model": ""}
+
+
+def test_diff_mode_skips_llm_steps_for_same_source(monkeypatch, caplog):
+    """元の設計書が同一（ダイジェストが一致）の場合は、構造化結果が異なっても差分検知以降のLLM呼び出しを省略する"""
+    new_md = f"# 詳細設計書\n\n<!-- source-digest: {DIGEST} -->\n\n今回の構造化結果"
+    old_md = f"# 詳細設計書\n\n<!-- source-digest: {DIGEST} -->\n\n前回の構造化結果"
+    monkeypatch.setattr(utils, "process_excel_to_markdown", lambda files, progress_callback=None, job_id=None: (new_md, dict(ZERO_USAGE)))
+    monkeypatch.setattr(utils, "convert_md_to_excel_and_csv", lambda md, is_diff_mode=False: (b"", b""))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("LLMを呼び出してはいけない")
+
+    for name in ("warm_test_spec_cache", "detect_diff", "extract_perspectives_with_diff", "create_test_spec_with_diff"):
+        monkeypatch.setattr(llm_service, name, fail)
+
+    old_structured = SimpleNamespace(read=lambda: old_md.encode("utf-8"))
+    old_test_spec = SimpleNamespace(read=lambda: "旧版テスト仕様書".encode("utf-8"))
+
+    with caplog.at_level(logging.INFO):
+        zip_file, token_stats = diff_mode.generate_diff_test_spec([SimpleNamespace(filename="設計書.xlsx")], old_structured, old_test_spec, "simple")
+
+    with zip_file, zipfile.ZipFile(io.BytesIO(zip_file.read())) as archive:
+        assert archive.read("差分サマリー.md").decode("utf-8") == "差分なし"
+        assert archive.read("テスト仕様書.md").decode("utf-8") == "旧版テスト仕様書"
+    assert set(token_stats.values()) == {0}
+    assert "=== 合計コスト: $0.0000 ===" in caplog.messages
+
+
+def test_diff_mode_reads_old_files_outside_llm_executor(monkeypatch):
+    """旧版ファイルの読み込みはLLM呼び出し用のスレッドプールを使用しない"""
+    import threading
+
+    def fail_executor():
+        raise AssertionError("LLM呼び出し用のスレッドプールを使用してはいけない")
+
+    monkeypatch.setattr(llm_service, "get_executor", fail_executor)
+    monkeypatch.setattr(utils, "process_excel_to_markdown", lambda files, progress_callback=None, job_id=None: ("同一", dict(ZERO_USAGE)))
+    monkeypatch.setattr(utils, "convert_md_to_excel_and_csv", lambda md, is_diff_mode=False: (b"", b""))
+
+    thread_names = []
+
+    def read_old():
+        thread_names.append(threading.current_thread().name)
+        return "同一".encode("utf-8")
+
+    old_file = SimpleNamespace(read=read_old)
+    zip_file, _ = diff_mode.generate_diff_test_spec([SimpleNamespace(filename="設計書.xlsx")], old_file, old_file, "simple")
+    zip_file.close()
+
+    assert len(thread_names) == 2
+    assert all(name.startswith("old-md") for name in thread_names)
@@ -0,0 +1,77 @@
+import time
+
+import function_app
+
+
+def test_throttled_progress_writer_writes_last_update():
+    """間隔内に続いた更新は保留され、最後の更新がタイマーで書き込まれる"""
+    written = []
+    writer = function_app.ThrottledProgressWriter(lambda *args: written.append(args), interval=0.05)
+
+    writer.update("structuring", "1/3", 10)
+    writer.update("structuring", "2/3", 20)
+    writer.update("structuring", "3/3", 30)
+    assert written == [("structuring", "1/3", 10)]
+
+    time.sleep(0.2)
+    assert written == [("structuring", "1/3", 10), ("structuring", "3/3", 30)]
+
+
+def test_throttled_progress_writer_force_and_flush():
+    """完了時（force）は即座に書き込み、それより前に保留された更新は書き込まない"""
+    written = []
+    writer = function_app.ThrottledProgressWriter(lambda *args: written.append(args), interval=60)
+
+    writer.update("testspec", "生成中", 70)
+    writer.update("converting", "変換中", 90)
+    writer.update("completed", "完了", 100, force=True)
+    writer.flush()
+    assert written == [("testspec", "生成中", 70), ("completed", "完了", 100)]
+
+    # 間隔内の更新は保留され、flushで書き込まれる
+    writer.update("completed", "完了", 100)
+    assert len(written) == 2
+    writer.flush()
+    assert len(written) == 3
+
+
+def test_modes_use_durable_progress_manager(monkeypatch):
+    """function_app読み込み後は、normal_mode/diff_modeの進捗更新がActivityのコールバックを経由する"""
+    from types import SimpleNamespace
+
+    from core import diff_mode, llm_service, normal_mode, utils
+
+    recorded = []
+    flushed = []
+    monkeypatch.setattr(function_app, "_progress_callback", lambda *args: recorded.append(args))
+    monkeypatch.setattr(function_app, "_progress_flush_callback", lambda: flushed.append(True))
+
+    usage = {"input_tokens": 0, "output_tokens": 0, "model": ""}
+
+    def fake_process_excel_to_markdown(files, progress_callback=None, job_id=None):
+        progress_callback("structuring", "設計書を構造化中...", 20)
+        return "# 詳細設計書", dict(usage)
+
+    monkeypatch.setattr(utils, "process_excel_to_markdown", fake_process_excel_to_markdown)
+    monkeypatch.setattr(utils, "convert_md_to_excel_and_csv", lambda md, is_diff_mode=False: (b"", b""))
+    monkeypatch.setattr(llm_service, "warm_test_spec_cache", lambda *args, **kwargs: None)
+    monkeypatch.setattr(llm_service, "extract_test_perspectives", lambda *args, **kwargs: ("観点", dict(usage)))
+    monkeypatch.setattr(llm_service, "create_test_spec", lambda *args, **kwargs: ("仕様書", dict(usage)))
+
+    zip_file, _ = normal_mode.generate_normal_test_spec([SimpleNamespace(filename="設計書.xlsx")], "simple", "job")
+    zip_file.close()
+
+    assert recorded[0] == ("structuring", "設計書を構造化中...", 20)
+    assert recorded[-1] == ("completed", "完了しました", 100)
+    assert flushed == [True]
+
+    # 差分モードも同じ実装を使用する
+    instances = []
+    monkeypatch.setattr(function_app.DurableProgressManager, "__init__", lambda self: instances.append(self))
+    old_file = SimpleNamespace(read=lambda: b"# old")
+    monkeypatch.setattr(llm_service, "detect_diff", lambda *args, **kwargs: ("差分", dict(usage)))
+    monkeypatch.setattr(llm_service, "extract_perspectives_with_diff", lambda *args, **kwargs: ("観点", dict(usage)))
+    monkeypatch.setattr(llm_service, "create_test_spec_with_diff", lambda *args, **kwargs: ("仕様書", dict(usage)))
+    zip_file, _ = diff_mode.generate_diff_test_spec([SimpleNamespace(filename="設計書.xlsx")], old_file, old_file, "simple", "job")
+    zip_file.close()
+    assert len(instances) == 1 and isinstance(instances[0], function_app.DurableProgressManager)
@@ -0,0 +1,126 @@
+from core import llm_service, response_cache
+
+MODEL = "test-model"
+
+
+def test_structuring_batch_fallback_after_cache_hit(monkeypatch, tmp_path):
+    """バッチ呼び出しが応答キャッシュにヒットし、分割に失敗してシートごとの再実行になっても使用量を合算できる"""
+    monkeypatch.setattr(llm_service, "get_config", lambda: {"model_structuring": MODEL})
+    monkeypatch.setattr(response_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(response_cache, "get_backend", lambda: response_cache.FileCacheBackend(str(tmp_path)))
+
+    prompts = ["シート1の内容", "シート2の内容"]
+    # 区切り行が1つしかない応答をキャッシュしておく（シート数と一致しない）
+    batch_prompt = "\n\n".join(f"{llm_service.STRUCTURING_BATCH_DELIMITER}\n{prompt}" for prompt in prompts)
+    key = response_cache.make_key(MODEL, llm_service.STRUCTURING_PROMPT + llm_service.STRUCTURING_BATCH_INSTRUCTION, batch_prompt)
+    response_cache.save(key, f"{llm_service.STRUCTURING_BATCH_DELIMITER}\n結合された応答")
+
+    sheet_usage = {"input_tokens": 10, "output_tokens": 5, "cache_creation_input_tokens": 3, "cache_read_input_tokens": 2, "model": MODEL}
+    monkeypatch.setattr(llm_service, "structuring", lambda prompt: (f"構造化: {prompt}", dict(sheet_usage)))
+
+    contents, usage = llm_service.structuring_batch(prompts)
+
+    assert contents == ["構造化: シート1の内容", "構造化: シート2の内容"]
+    assert usage["input_tokens"] == 20
+    assert usage["output_tokens"] == 10
+    assert usage["cache_creation_input_tokens"] == 6
+    assert usage["cache_read_input_tokens"] == 4
+
+
+def test_structuring_batch_fallback_with_partial_usage(monkeypatch):
+    """バッチ呼び出しの使用量にキャッシュ系のキーがなくても、フォールバック時に合算できる"""
+    monkeypatch.setattr(llm_service, "get_config", lambda: {"model_structuring": MODEL})
+    monkeypatch.setattr(llm_service, "call_llm", lambda *args, **kwargs: ("区切りのない応答", {"input_tokens": 0, "output_tokens": 0, "model": MODEL}))
+    monkeypatch.setattr(llm_service, "structuring", lambda prompt: (prompt, {"input_tokens": 1, "output_tokens": 1, "cache_read_input_tokens": 1, "model": MODEL}))
+
+    contents, usage = llm_service.structuring_batch(["a", "b", "c"])
+
+    assert contents == ["a", "b", "c"]
+    assert usage["input_tokens"] == 3
+    assert usage["cache_read_input_tokens"] == 3
+    assert usage["cache_creation_input_tokens"] == 0
+
+
+class _FakeStream:
+    """client.messages.stream()の代替（指定した位置で例外を送出する）"""
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @property
+    def text_stream(self):
+        yield from self.chunks
+        if self.error:
+            raise self.error
+
+    def get_final_message(self):
+        usage = type("Usage", (), {"input_tokens": 7, "output_tokens": 3, "cache_creation_input_tokens": None, "cache_read_input_tokens": 4})()
+        return type("Message", (), {"usage": usage})()
+
+
+def test_call_llm_restarts_after_mid_stream_error(monkeypatch):
+    """応答途中の一時エラーでは受信済みのチャンクを破棄して呼び出し直す"""
+    streams = [_FakeStream(["途中", "まで"], ConnectionError("切断")), _FakeStream(["完全な", "応答"])]
+    client = type("Client", (), {})()
+    client.messages = type("Messages", (), {"stream": staticmethod(lambda **kwargs: streams.pop(0))})()
+    monkeypatch.setattr(llm_service, "get_client", lambda: client)
+    monkeypatch.setattr(llm_service, "is_retriable_error", lambda e: isinstance(e, ConnectionError))
+    monkeypatch.setattr(llm_service.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(response_cache, "CACHE_ENABLED", False)
+
+    result, usage = llm_service.call_llm("system", "user", MODEL)
+
+    assert result == "完全な応答"
+    assert usage == {"input_tokens": 7, "output_tokens": 3, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 4, "model": MODEL}
+    assert streams == []
+
+
+def test_blob_cache_backend_uses_shared_data_client(monkeypatch):
+    """blobバックエンドは生成結果用（data）の共有クライアントでコンテナを作成する"""
+    from azure.core.exceptions import ResourceExistsError
+
+    from core import progress_manager
+
+    purposes = []
+    created = []
+
+    class FakeContainerClient:
+        def create_container(self):
+            created.append(True)
+            raise ResourceExistsError("exists")
+
+    class FakeBlobServiceClient:
+        def get_container_client(self, name):
+            assert name == response_cache.CACHE_CONTAINER
+            return FakeContainerClient()
+
+    def fake_get_blob_service_client(purpose="progress"):
+        purposes.append(purpose)
+        return FakeBlobServiceClient()
+
+    monkeypatch.setattr(progress_manager, "get_blob_service_client", fake_get_blob_service_client)
+    response_cache.BlobCacheBackend(response_cache.CACHE_CONTAINER)
+
+    assert purposes == ["data"]
+    assert created == [True]
+
+
+def test_config_reads_environment_after_import(monkeypatch):
+    """動作設定はインポート時ではなくget_configの初回呼び出し時に読み込む（空文字は既定値）"""
+    monkeypatch.setenv("STRUCTURING_SHEET_MAX_CHARS", "1234")
+    monkeypatch.setenv("LLM_RETRY_DEADLINE_SECONDS", "")
+    monkeypatch.setenv("LLM_SPECULATIVE_WARM", "true")
+    llm_service.get_config.cache_clear()
+    try:
+        config = llm_service.get_config()
+        assert config["structuring_sheet_max_chars"] == 1234
+        assert config["retry_deadline_seconds"] == 900
+        assert config["speculative_warm"] is True
+    finally:
+        llm_service.get_config.cache_clear()
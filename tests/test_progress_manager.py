@@ -0,0 +1,69 @@
+import importlib.util
+import json
+import threading
+
+import core.progress_manager
+
+# function_appの読み込み後はProgressManagerがDurable Functions用に置き換えられるため、別のモジュールとして読み込む
+_spec = importlib.util.spec_from_file_location("progress_manager_under_test", core.progress_manager.__file__)
+progress_manager = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(progress_manager)
+
+
+class FakeBlobServiceClient:
+    """書き込まれた進捗を記録するBlobServiceClientの代替"""
+    def __init__(self):
+        self.uploads = []
+        self.created_containers = []
+        self.release = threading.Event()
+
+    def create_container(self, name):
+        self.created_containers.append(name)
+
+    def get_blob_client(self, container, blob):
+        client = self
+
+        class FakeBlobClient:
+            def upload_blob(self, data, **kwargs):
+                client.release.wait(5)
+                client.uploads.append((blob, json.loads(data)))
+
+        return FakeBlobClient()
+
+
+def test_progress_manager_coalesces_updates(monkeypatch):
+    """更新はすぐに戻り、書き込み中に溜まった更新は最新のもののみ書き込まれる"""
+    fake = FakeBlobServiceClient()
+    monkeypatch.setattr(progress_manager, "get_blob_service_client", lambda purpose="progress": fake)
+    manager = progress_manager.ProgressManager()
+
+    # 最初の書き込みが終わるまでの間に更新が続いても、update_progressは書き込みを待たない
+    for percent in range(10, 40):
+        manager.update_progress("job", "structuring", "構造化中", percent)
+    fake.release.set()
+    manager.update_progress("job", "completed", "完了しました", 100)
+    manager.flush()
+
+    assert fake.uploads[-1] == ("job.json", {**fake.uploads[-1][1], "stage": "completed", "progress": 100})
+    assert len(fake.uploads) < 31
+
+
+def test_progress_manager_creates_container_once(monkeypatch):
+    """コンテナ作成はプロセス内で1回だけ行い、既存の場合のエラーのみ無視する"""
+    from azure.core.exceptions import ResourceExistsError
+
+    fake = FakeBlobServiceClient()
+    calls = []
+
+    def create_container(name):
+        calls.append(name)
+        raise ResourceExistsError("exists")
+
+    fake.create_container = create_container
+    monkeypatch.setattr(progress_manager, "get_blob_service_client", lambda purpose="progress": fake)
+    monkeypatch.setattr(progress_manager.ProgressManager, "_container_ready", False)
+
+    progress_manager.ProgressManager()
+    progress_manager.ProgressManager()
+
+    assert calls == ["progress"]
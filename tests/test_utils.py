@@ -0,0 +1,101 @@
+import io
+from types import SimpleNamespace
+
+import pandas as pd
+
+from core import llm_service, response_cache, utils
+
+
+def make_excel_file(filename, sheets):
+    """シート名 -> 行のリスト からアップロードファイル相当のオブジェクトを生成"""
+    stream = io.BytesIO()
+    with pd.ExcelWriter(stream, engine="openpyxl") as writer:
+        for sheet_name, rows in sheets.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=sheet_name, header=False, index=False)
+    stream.seek(0)
+    return SimpleNamespace(filename=filename, stream=stream)
+
+
+def test_collapse_blank_lines():
+    """連続する空行は1行にまとめ、先頭・末尾の空行は除く"""
+    assert list(utils.collapse_blank_lines(["", "a", "", "", "b", "", ""])) == ["a", "", "b"]
+
+
+def test_split_sheet_text_prefers_blank_lines():
+    """上限を超える内容は空行（区切り）の位置で分割し、上限を超えない"""
+    raw_text = "\n".join(["項目A | 値"] * 3 + [""] + ["項目B | 値"] * 3)
+    parts = utils.split_sheet_text(raw_text, 30)
+    assert parts == ["\n".join(["項目A | 値"] * 3), "\n".join(["項目B | 値"] * 3)]
+    assert utils.split_sheet_text(raw_text, 0) == [raw_text]
+    assert all(len(part) <= 4 for part in utils.split_sheet_text("x" * 10, 4))
+
+
+def test_process_excel_to_markdown_splits_oversized_sheet(monkeypatch):
+    """上限を超えるシートは分割して構造化し、空行の区切りは1行にまとめて残す"""
+    monkeypatch.setattr(response_cache, "CACHE_ENABLED", False)
+    config = {**llm_service.get_config(), "structuring_sheet_max_chars": 60}
+    monkeypatch.setattr(llm_service, "get_config", lambda: config)
+    structured_prompts = []
+
+    def fake_structuring(prompt):
+        structured_prompts.append(prompt)
+        return f"構造化{len(structured_prompts)}", {"input_tokens": 1, "output_tokens": 2, "model": "m"}
+
+    def fake_structuring_batch(prompts):
+        return [f"小{i}" for i in range(len(prompts))], {"input_tokens": 1, "output_tokens": 1, "model": "m"}
+
+    monkeypatch.setattr(llm_service, "structuring", fake_structuring)
+    monkeypatch.setattr(llm_service, "structuring_batch", fake_structuring_batch)
+
+    large_rows = [[f"行{i}", "説明"] for i in range(10)] + [[None, None]] * 3 + [[f"次{i}", "説明"] for i in range(10)]
+    file = make_excel_file("設計書.xlsx", {"大": large_rows, "小": [["a", "b"]]})
+
+    md_output, usage = utils.process_excel_to_markdown([file])
+
+    assert len(structured_prompts) > 1
+    assert all(len(prompt.split("\n", 1)[1]) <= 60 for prompt in structured_prompts)
+    assert structured_prompts[0].startswith(f"--- Excelシート「設計書_大」（1/{len(structured_prompts)}） ---")
+    assert "## 設計書_大\n\n構造化1\n\n構造化2" in md_output
+    assert "## 設計書_小\n\n小0" in md_output
+    assert usage["input_tokens"] == len(structured_prompts) + 1
+    assert usage["output_tokens"] == 2 * len(structured_prompts) + 1
+    # 3行の空行は1行の空行（区切り）にまとめられる
+    joined = "\n".join(prompt.split("\n", 1)[1] for prompt in structured_prompts)
+    assert "\n\n\n" not in joined
+
+
+def test_summarize_token_stats_includes_cache_tokens():
+    """キャッシュ書き込み・読み込みのトークンも集計し、キーがない使用量情報は0として扱う"""
+    stats = utils.summarize_token_stats(
+        {"input_tokens": 10, "output_tokens": 5, "cache_creation_input_tokens": 1000, "cache_read_input_tokens": 0, "model": "m"},
+        {"input_tokens": 20, "output_tokens": 7, "cache_read_input_tokens": 1000, "model": "m"},
+        {"input_tokens": 0, "output_tokens": 0, "model": ""},
+    )
+    assert stats == {
+        "total_input_tokens": 30,
+        "total_output_tokens": 12,
+        "total_cache_creation_tokens": 1000,
+        "total_cache_read_tokens": 1000,
+    }
+
+
+def test_source_digest_ignores_llm_output_and_file_name(monkeypatch):
+    """ダイジェストは構造化前のシート内容から求め、LLMの出力やファイル名・空白の違いでは変わらない"""
+    monkeypatch.setattr(response_cache, "CACHE_ENABLED", False)
+    calls = []
+
+    def fake_structuring_batch(prompts):
+        calls.append(prompts)
+        return [f"実行{len(calls)}の出力"] * len(prompts), {"input_tokens": 0, "output_tokens": 0, "model": "m"}
+
+    monkeypatch.setattr(llm_service, "structuring_batch", fake_structuring_batch)
+
+    old_md, _ = utils.process_excel_to_markdown([make_excel_file("設計書_v1.xlsx", {"画面": [["項目", "値"]]})])
+    new_md, _ = utils.process_excel_to_markdown([make_excel_file("設計書_v2.xlsx", {"画面": [["項目 ", " 値"]]})])
+    changed_md, _ = utils.process_excel_to_markdown([make_excel_file("設計書_v2.xlsx", {"画面": [["項目", "新しい値"]]})])
+
+    assert old_md != new_md
+    assert utils.extract_source_digest(old_md) is not None
+    assert utils.extract_source_digest(old_md) == utils.extract_source_digest(new_md)
+    assert utils.extract_source_digest(changed_md) != utils.extract_source_digest(old_md)
+    assert utils.extract_source_digest("# 詳細設計書\n\n## 目次") is None